@@ -1,10 +1,20 @@
 
 import random, operator
 
-import sprite, slabcache, config, env
+import sprite, slabcache, config, env, navigation
 from util import *
 
+def atlas(archetype):
+    "The frame table and collision rectangle shared by every actor of ARCHETYPE, compiled on first use."
+    if 'atlas' not in archetype:
+        slab = slabcache.load(archetype['slab'])
+        archetype['atlas'] = (sprite.compile_frames(slab, archetype['animations']),
+                              Rect(archetype['collision rectangle']))
+    return archetype['atlas']
+
 class Actor(sprite.Sprite):
+    __slots__ = ('archetype', 'properties', 'parent', 'slot', '_position', '_velocity',
+                 'collision_rect', 'previous_center', 'drawn', 'index')
     (HARMFUL, PREY, HUNTER) = range(3)
 
     def get_x(self): return self.position[0]
@@ -13,28 +23,57 @@ class Actor(sprite.Sprite):
     def get_y(self): return self.position[1]
     def set_y(self, value): self.position = (self.position[0], value)
     y = property(get_y, set_y)
+    # position and velocity live in the room's physics batch when it
+    # has one, otherwise on the actor itself
+    def get_position(self):
+        return self._position if self.slot is None else self.parent.batch.position[self.slot]
+    def set_position(self, value):
+        if self.slot is None: self._position = value
+        else: self.parent.batch.position[self.slot] = value
+    position = property(get_position, set_position)
+    def get_velocity(self):
+        return self._velocity if self.slot is None else self.parent.batch.velocity[self.slot]
+    def set_velocity(self, value):
+        if self.slot is None: self._velocity = value
+        else: self.parent.batch.velocity[self.slot] = value
+    velocity = property(get_velocity, set_velocity)
 
     def __init__(self, archetype=None, spawn_pt=(0,0), parent=None, velocity=(0,0), **kwds):
-        sprite.Sprite.__init__(self, slab=slabcache.load(archetype['slab']),
-                               position=spawn_pt,
-                               animations=archetype['animations'], **kwds)
+        (frames, self.collision_rect) = atlas(archetype)
+        sprite.Sprite.__init__(self, position=spawn_pt, frames=frames, **kwds)
         (self.archetype, self.properties) = (archetype, archetype['properties'])
-        (self.position,self.velocity) = (spawn_pt, velocity)
-        self.collision_rect = Rect(archetype['collision rectangle'])
         self.parent = parent
+        self.slot = None if parent.batch is None else parent.batch.add(spawn_pt, velocity)
+        (self.position,self.velocity) = (spawn_pt, velocity)
+        # where the last simulation step started, and where the actor
+        # was last drawn
+        (self.previous_center, self.drawn) = (self.rect.center, None)
         parent.smirch(self.rect)
 
     def die(self): self.parent.reap(self)
 
+    # drops what ties a pooled instance to its room, so a reaped
+    # instance waiting in the pool keeps no room alive
+    def release(self): (self.parent, self.slot, self.drawn) = (None, None, None)
+
     def act(self, delta_t):
         sprite.Sprite.update(self, delta_t)
 
     def update_motion(self, delta_t):
-        self.parent.smirch(self.rect.inflate(1,1))
-        self.position = map(operator.add, self.position, self.velocity)
+        self.previous_center = self.rect.center
+        # batched actors were already integrated by the room
+        if self.slot is None:
+            self.position = map(operator.add, self.position, self.velocity)
+            self.velocity = map(lambda x: damp(x, config.DAMPING), self.velocity)
         self.rect.center = self.position
         self.rect_valid = False
-        self.velocity = map(lambda x: damp(x, config.DAMPING), self.velocity)
+        self.parent.relocate(self)
+
+    def draw(self, alpha=1.0):
+        "Draws between the previous and current step by ALPHA; returns the area drawn."
+        k = 1.0 - alpha
+        ((px,py), (cx,cy)) = (self.previous_center, self.rect.center)
+        return sprite.Sprite.draw(self, self.rect.move(int(round((px-cx)*k)), int(round((py-cy)*k))))
 
     def border_collide(self, facing): pass
     def tile_collide(self, position, properties): pass
@@ -42,6 +81,8 @@ class Actor(sprite.Sprite):
     def harmful_to(self, other): return Actor.HARMFUL in self.properties
 
 class HumanoidActor(Actor):
+    __slots__ = ('facing', 'act_fn', 'invulnerability_counter')
+
     def __init__(self, **kwds):
         Actor.__init__(self, **kwds)
         self.facing = Facing.NORTH
@@ -86,6 +127,8 @@ class HumanoidActor(Actor):
         return True
 
 class ShotActor(Actor):
+    __slots__ = ('vector', 'owner', 'disown_delay')
+
     def __init__(self, vector=(-1,0), owner=None, **kwds):
         Actor.__init__(self, **kwds)
         (self.vector,self.owner,self.disown_delay) = (vector,owner,self.archetype['disown delay'])
@@ -100,7 +143,7 @@ class ShotActor(Actor):
     def tile_collide(self, position, properties): self.die()
 
     def collide(self, other):
-        if other is self.owner or (other.__dict__.has_key('owner') and
+        if other is self.owner or (hasattr(other, 'owner') and
                                    other.owner is self.owner):
             return False
         self.die()
@@ -108,8 +151,32 @@ class ShotActor(Actor):
 
     def harmful_to(self, other): return other is not self.owner
 
+    def release(self):
+        Actor.release(self)
+        self.owner = None
+
 class RobotActor(Actor):
+    __slots__ = ('facing', 'act_fn', 'dying_counter')
+
+    def face(self, facing):
+        self.facing = facing
+        self.animation(Facing.to_anim_name(facing))
+
+    def cell(self):
+        "Where the robot is on the room's flow field."
+        return self.parent.navigation.cell_of(self.parent.centre_of(self))
+
     def roam(self, delta_t):
+        tile = self.parent.tile_of(self)
+        distance = self.parent.navigation.distance_from(self.cell())
+        if distance <= self.archetype['hunting range'] or (self.parent.sees_humanoid(self) and
+                                                           distance != navigation.UNREACHABLE):
+            self.act_fn = self.hunt
+            return self.hunt(delta_t)
+        # otherwise head for shots heard or the humanoid's scent
+        if self.parent.senses is not None:
+            facing = self.parent.senses.direction(tile)
+            if facing is not None and facing != self.facing: self.face(facing)
         self.velocity = map(lambda x:x*self.archetype['walking speed']*delta_t,
                             Facing.offsets[self.facing])
 
@@ -123,7 +190,26 @@ class RobotActor(Actor):
             self.facing = random.choice(Facing.directions)
             self.animation(Facing.to_anim_name(self.facing))
 
-    def hunt(self, delta_t): pass
+    # follow the room's flow field toward the humanoid; on the goal
+    # cell itself, keep going the same way.  The robot keeps to the
+    # line through its cell's centre, and stops to get back onto it if
+    # it has strayed far enough to catch a wall on the way.  Where
+    # there is no path for a robot, it roams.
+    def hunt(self, delta_t):
+        (field, cell) = (self.parent.navigation, self.cell())
+        distance = field.distance_from(cell)
+        if distance == navigation.UNREACHABLE or (distance > 2*self.archetype['hunting range'] and
+                                                  not self.parent.sees_humanoid(self)):
+            self.act_fn = self.roam
+            return self.roam(delta_t)
+        facing = field.direction(cell)
+        if facing is not None and facing != self.facing: self.face(facing)
+        speed = self.archetype['walking speed']*delta_t
+        ((dx,dy), (cx,cy), (px,py)) = (Facing.offsets[self.facing], field.centre(cell), self.parent.centre_of(self))
+        (ex, ey) = ((cx-px)*(1-abs(dx)), (cy-py)*(1-abs(dy)))
+        if abs(ex)+abs(ey) > field.slack: (dx,dy) = (0,0)
+        self.velocity = (dx*speed + max(-speed, min(speed, ex)), dy*speed + max(-speed, min(speed, ey)))
+
     def dying(self, delta_t):
         self.dying_counter -= delta_t
         self.facing = (self.facing + 1) % len(Facing.directions)
@@ -156,6 +242,7 @@ archetypes = {
          'properties':set([Actor.PREY]),
          'slab':'neutopia-rip-1.png',
          'spawn invulnerability':3,
+         'scent':4.0,           # left per second where it stands
          'walking speed':50,    # pixels/second
          'creep modifier':0.5,
          'shot speed':60,       # pixels/second
@@ -171,6 +258,7 @@ archetypes = {
          'slab':'robot.png',
          'walking speed':50,    # pixels/second
          'shot speed':45,       # pixels/second
+         'hunting range':6,     # tiles of path to the humanoid
          'collision rectangle': (0,0,25,25),
          'animations':{'face south': [(0,Rect(0,0,25,20))],
                        'face north': [(0,Rect(25,0,25,20))],
@@ -179,9 +267,11 @@ archetypes = {
          },
     'shot':
         {'class':ShotActor,
+         'pool':[],             # reaped shots, reinitialized by the next spawn
          'properties':set([Actor.HARMFUL]),
          'slab':'shot.png',
          'disown delay':2,
+         'noise':5.0,           # made where it is fired
          'collision rectangle': (0,0,6,6),
          'animations':{'default': [(.1,Rect(0,0,6,6)),
                                    (.05,Rect(6,0,6,6)),
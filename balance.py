@@ -0,0 +1,87 @@
+"""
+Batch balance runs.  Fans seeded headless bench.simulate() episodes out
+over a process pool and summarizes survival time, kills, deaths and
+frame cost across them, so changes to archetypes and config can be
+judged on many games rather than one.
+
+    python balance.py [-episodes N] [-frames N] [-seed N] [-robots N]
+                      [-shot-rate R] [-level N] [-processes N]
+                      [-set NAME=VALUE]... [-sweep NAME=V1,V2,...]
+
+NAME is either a config constant, as in DAMPING=0.8, or an archetype
+and one of its keys, as in robot.walking-speed=60 (hyphens stand for
+spaces).  VALUE is a Python literal.  -set applies to every episode;
+-sweep runs the whole batch once for each of its values.
+"""
+import sys, os, ast, timeit, multiprocessing
+
+import config, env, actor, bench
+
+def override(name, value):
+    "Sets config constant or archetype key NAME to VALUE."
+    if '.' in name:
+        (archetype, key) = name.split('.', 1)
+        actor.archetypes[archetype][key.replace('-', ' ')] = value
+    else:
+        if not hasattr(config, name): raise KeyError(name)
+        setattr(config, name, value)
+
+def _parse(assignment):
+    (name, value) = assignment.split('=', 1)
+    return (name, ast.literal_eval(value))
+
+def _start_worker(overrides):
+    env.init(set(['headless']))
+    for (name, value) in overrides: override(name, value)
+
+def _episode(args):
+    (seed, kwds) = args
+    stats = bench.simulate(seed=seed, **kwds)
+    times = sorted(stats['times'])
+    return (stats['survival'], stats['kills'], stats['deaths'],
+            stats['seconds']/stats['frames'], bench.percentile(times, 99))
+
+def run(episodes=100, seed=0, overrides=(), processes=None, **kwds):
+    """
+    Runs EPISODES episodes, seeded SEED onward, with OVERRIDES, a list
+    of (name, value), applied in every worker; other keywords go to
+    bench.simulate().  Returns per-measure (mean, min, max).
+    """
+    pool = multiprocessing.Pool(processes, _start_worker, (list(overrides),))
+    try:
+        results = pool.map(_episode, [(seed+i, kwds) for i in xrange(episodes)],
+                           chunksize=max(1, episodes // (4*(processes or multiprocessing.cpu_count()))))
+    finally:
+        pool.close()
+        pool.join()
+    summary = {}
+    for (name, column) in zip(('survival', 'kills', 'deaths', 'frame', 'frame p99'), zip(*results)):
+        summary[name] = (sum(column)/float(len(column)), min(column), max(column))
+    return summary
+
+def report(summary, episodes, seconds):
+    print 'episodes:    %d in %.1fs (%.0f/minute)' % (episodes, seconds, 60*episodes/max(seconds, config.EPSILON))
+    for (name, scale, unit) in (('survival', 1, 's'), ('kills', 1, ''), ('deaths', 1, ''),
+                                ('frame', 1000, 'ms'), ('frame p99', 1000, 'ms')):
+        print '%-12s mean %8.3f  min %8.3f  max %8.3f %s' % ((name+':',) + tuple(scale*x for x in summary[name]) + (unit,))
+
+if __name__ == '__main__':
+    # the dummy driver has to be chosen before any worker starts pygame
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    _arg = bench._arg
+    overrides = [_parse(sys.argv[i+1]) for (i,a) in enumerate(sys.argv) if a == '-set']
+    sweep = _arg('-sweep', None, str)
+    if sweep is None:
+        batches = [overrides]
+    else:
+        (name, values) = sweep.split('=', 1)
+        batches = [overrides + [(name, ast.literal_eval(v))] for v in values.split(',')]
+    episodes = _arg('-episodes', 100)
+    for batch in batches:
+        if sweep is not None: print '== %s' % ', '.join('%s=%r' % o for o in batch)
+        t = timeit.default_timer()
+        summary = run(episodes=episodes, seed=_arg('-seed', 0), overrides=batch,
+                      processes=_arg('-processes', None), frames=_arg('-frames', 500),
+                      robots=_arg('-robots', 5), shot_rate=_arg('-shot-rate', 1.0, float),
+                      level_number=_arg('-level', 1))
+        report(summary, episodes, timeit.default_timer()-t)
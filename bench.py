@@ -0,0 +1,129 @@
+"""
+Headless simulation benchmark.  Runs a level's GameState for a fixed
+number of frames under SDL's dummy video driver with a fixed delta_t
+and seeded randomness, and reports throughput, per-frame time
+percentiles and the net number of GC-tracked objects allocated per
+frame, so that builds can be compared.
+
+    python bench.py [-frames N] [-seed N] [-robots N] [-shot-rate R] [-level N]
+    python bench.py -replay FILE [-frames N]
+
+-robots adds that many robots at random passable tiles on top of the
+level's own actors; -shot-rate is the mean number of shots per second
+the scripted humanoid fires while wandering.  -replay instead plays
+back a recorded session (see replay.py) from its own seed and level.
+"""
+import sys, gc, random, timeit
+
+import config, env, main, replay
+
+_now = timeit.default_timer
+
+class BenchState(main.GameState):
+    "A GameState that counts deaths, escapes and kills instead of ending."
+    def __init__(self, **kwds):
+        main.GameState.__init__(self, **kwds)
+        (self.deaths, self.escapes, self.kills) = (0, 0, 0)
+        # simulated seconds, and how many had passed at the first death
+        (self.elapsed, self.survival) = (0.0, None)
+        # steps taken, and the last one the humanoid pushed at a border
+        (self.steps, self.at_border) = (0, -2)
+
+    def update(self, delta_t):
+        self.elapsed += delta_t
+        self.steps += 1
+        return main.GameState.update(self, delta_t)
+
+    def humanoid_has_died(self):
+        self.deaths += 1
+        if self.survival is None: self.survival = self.elapsed
+
+    # the humanoid stays clamped at the border, pushing at it every
+    # step; only the first of a run of such steps is an escape
+    def humanoid_escapes(self, border):
+        if self.at_border < self.steps-1: self.escapes += 1
+        self.at_border = self.steps
+
+    def score_points(self, achievement):
+        main.GameState.score_points(self, achievement)
+        if achievement == 'killed robot': self.kills += 1
+
+def populate(state, robots, rng):
+    tilemap = state.room.tilemap
+    cells = [i for (i,p) in enumerate(tilemap.passable) if p]
+    for _ in xrange(robots):
+        i = rng.choice(cells)
+        state.room.spawn('robot', (((i % tilemap.w) << tilemap.tile_dim_pot) + tilemap.tile_dim/2,
+                                   ((i / tilemap.w) << tilemap.tile_dim_pot) + tilemap.tile_dim/2))
+
+class WanderPolicy:
+    "Holds a random direction for a while and fires at SHOT_RATE shots/second."
+    def __init__(self, rng, shot_rate=0.0, hold=0.5):
+        (self.rng, self.shot_rate, self.hold) = (rng, shot_rate, hold)
+        (self.held, self.accumulated_t) = (None, hold)
+
+    def __call__(self, delta_t):
+        self.accumulated_t += delta_t
+        for b in env.buttons: env.tapped[b] = False
+        if self.accumulated_t >= self.hold:
+            self.accumulated_t = 0
+            if self.held: env.pressed[self.held] = False
+            self.held = self.rng.choice(('UP','DOWN','LEFT','RIGHT',None))
+            if self.held: env.pressed[self.held] = env.tapped[self.held] = True
+        env.tapped['FIRE'] = self.rng.random() < self.shot_rate*delta_t
+
+def percentile(ordered, p):
+    return ordered[min(len(ordered)-1, int(p/100.0*len(ordered)))]
+
+def simulate(frames=1000, seed=0, robots=0, shot_rate=0.0, level_number=1, policy=None, recording=None):
+    if recording is not None:
+        (seed, level_number, policy) = (recording.seed, recording.level_number, recording)
+        frames = min(frames, len(recording))
+    random.seed(seed)
+    rng = random.Random(seed)
+    state = BenchState(level_number=level_number)
+    populate(state, robots, rng)
+    policy = policy or WanderPolicy(rng, shot_rate)
+    simulation = main.Simulation(state)
+    (times, allocations) = ([], [])
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in xrange(frames):
+            (t, n) = (_now(), gc.get_count()[0])
+            delta_t = env.update()
+            policy(delta_t)
+            simulation.advance(delta_t)
+            allocations.append(gc.get_count()[0] - n)
+            times.append(_now() - t)
+    finally:
+        gc.enable()
+    return {'frames': frames, 'seconds': sum(times), 'times': times, 'allocations': allocations,
+            'actors': len(state.room.actors), 'score': state.player.score,
+            'deaths': state.deaths, 'escapes': state.escapes, 'kills': state.kills,
+            'survival': state.elapsed if state.survival is None else state.survival}
+
+def report(stats):
+    ordered = sorted(stats['times'])
+    print 'frames:      %d in %.3fs (%.1f frames/s)' % (stats['frames'], stats['seconds'],
+                                                      stats['frames']/max(stats['seconds'], config.EPSILON))
+    print 'frame ms:    min %.3f  p50 %.3f  p90 %.3f  p99 %.3f  max %.3f' % tuple(
+        1000*x for x in (ordered[0], percentile(ordered, 50), percentile(ordered, 90),
+                         percentile(ordered, 99), ordered[-1]))
+    print 'allocations: %.1f/frame net, %d max' % (sum(stats['allocations'])/float(stats['frames']),
+                                                   max(stats['allocations']))
+    print 'final:       %d actors, score %d, %d kills, %d deaths, %d escapes' % (
+        stats['actors'], stats['score'], stats['kills'], stats['deaths'], stats['escapes'])
+    print 'survival:    %.2fs' % stats['survival']
+
+def _arg(name, default, kind=int):
+    if name not in sys.argv: return default
+    return kind(sys.argv[sys.argv.index(name)+1])
+
+if __name__ == '__main__':
+    env.init(set(['headless']))
+    recording = _arg('-replay', None, replay.Player)
+    report(simulate(frames=_arg('-frames', 1000 if recording is None else len(recording)),
+                    seed=_arg('-seed', 0), robots=_arg('-robots', 0),
+                    shot_rate=_arg('-shot-rate', 0.0, float), level_number=_arg('-level', 1),
+                    recording=recording))
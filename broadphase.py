@@ -0,0 +1,58 @@
+
+class SpatialHash:
+    """
+    Uniform grid broad phase.  Each item is filed under every cell its
+    rectangle touches; only items sharing a cell are ever compared.
+    Items remember the order in which they were first filed, so
+    candidates come back in the same order as a brute-force scan of
+    the spawn list would produce them.
+    """
+    def __init__(self, cell_dim_pot=4):
+        self.shift = cell_dim_pot
+        (self.cells, self.extents, self.order) = ({}, {}, {})
+        self.serial = 0
+
+    def _extent(self, rect):
+        s = self.shift
+        return (rect.left>>s, rect.top>>s,
+                max(rect.left,rect.right-1)>>s, max(rect.top,rect.bottom-1)>>s)
+
+    def _cells_of(self, extent):
+        (x0,y0,x1,y1) = extent
+        for y in xrange(y0, y1+1):
+            for x in xrange(x0, x1+1):
+                yield (x,y)
+
+    def file(self, item, rect):
+        extent = self._extent(rect)
+        old = self.extents.get(item)
+        if old == extent: return
+        if old is None:
+            self.order[item] = self.serial
+            self.serial += 1
+        else:
+            self._unfile(item, old)
+        self.extents[item] = extent
+        for cell in self._cells_of(extent):
+            if cell in self.cells: self.cells[cell].append(item)
+            else: self.cells[cell] = [item]
+
+    def _unfile(self, item, extent):
+        for cell in self._cells_of(extent):
+            bucket = self.cells[cell]
+            bucket.remove(item)
+            if not bucket: del self.cells[cell]
+
+    def remove(self, item):
+        extent = self.extents.pop(item, None)
+        if extent is None: return
+        del self.order[item]
+        self._unfile(item, extent)
+
+    def candidates(self, item):
+        "Items sharing at least one cell with ITEM, in filing order."
+        found = set()
+        for cell in self._cells_of(self.extents[item]):
+            found.update(self.cells[cell])
+        found.discard(item)
+        return sorted(found, key=self.order.__getitem__)
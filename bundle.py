@@ -0,0 +1,74 @@
+"""
+Asset bundles.  A bundle holds any number of slabs as raw pixel data,
+so loading one from it builds a surface straight from a memory map of
+the file instead of decoding a PNG.  All integers are little-endian.
+
+    header      'BZAB', u16 version, u16 slab count
+    index       per slab: u8 length + file name, u16 w, u16 h,
+                u8 alpha, u32 offset, u32 length
+    pixels      per slab: rows of RGB, or RGBA if alpha is set
+
+slabcache looks in the mounted bundle before the file system.  To
+pack the game's slabs (or just the files named):
+
+    python bundle.py assets.bzab [file.png ...]
+"""
+import sys, struct, mmap, logging
+import pygame
+
+MAGIC = 'BZAB'
+VERSION = 1
+_header = struct.Struct('<4sHH')
+_entry = struct.Struct('<HHBII')
+
+class Bundle:
+    def __init__(self, path):
+        logging.debug('bundle: Mapping "%s".' % path)
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, count) = _header.unpack_from(self.data, 0)
+        if magic != MAGIC: raise ValueError('%s: not an asset bundle' % path)
+        if version != VERSION: raise ValueError('%s: unsupported bundle version %d' % (path, version))
+        (self.index, at) = ({}, _header.size)
+        for _ in xrange(count):
+            n = ord(self.data[at])
+            name = self.data[at+1:at+1+n]
+            self.index[name] = _entry.unpack_from(self.data, at+1+n)
+            at += 1 + n + _entry.size
+
+    def __contains__(self, file): return file in self.index
+
+    def surface(self, file):
+        "A surface over FILE's pixels in the bundle; convert it before use, as with a decoded image."
+        (w, h, alpha, offset, length) = self.index[file]
+        return pygame.image.frombuffer(buffer(self.data, offset, length), (w,h), 'RGBA' if alpha else 'RGB')
+
+def write(path, files):
+    "Packs the image FILES into a bundle at PATH."
+    entries = []
+    for file in files:
+        image = pygame.image.load(file)
+        alpha_p = bool(image.get_flags() & pygame.SRCALPHA)
+        entries.append((file, image.get_size(), alpha_p,
+                        pygame.image.tostring(image, 'RGBA' if alpha_p else 'RGB')))
+    offset = _header.size + sum(1 + len(file) + _entry.size for (file, _, _, _) in entries)
+    with open(path, 'wb') as f:
+        f.write(_header.pack(MAGIC, VERSION, len(entries)))
+        for (file, (w,h), alpha_p, pixels) in entries:
+            f.write(struct.pack('<B', len(file)) + file)
+            f.write(_entry.pack(w, h, alpha_p, offset, len(pixels)))
+            offset += len(pixels)
+        for (_, _, _, pixels) in entries: f.write(pixels)
+
+def game_slabs():
+    "Every slab the game loads: screens, font, archetypes and the rooms of every level."
+    import config, actor, level, main
+    slabs = set([config.SPLASH_IMAGE, config.TITLE_IMAGE, config.ENDGAME_IMAGE, 'megafont.png'])
+    slabs.update(archetype['slab'] for archetype in actor.archetypes.itervalues())
+    for path in main.levels:
+        l = level.load(path)
+        slabs.update(l.room(i)['slab'] for i in xrange(len(l)))
+    return sorted(slabs)
+
+if __name__ == '__main__':
+    write(sys.argv[1], sys.argv[2:] or game_slabs())
@@ -7,17 +7,41 @@ file.
 
 VIRTUAL_DIMENSIONS = (320,240)
 SCALE = 2
+# how vbuffer is enlarged to the window: 'nearest', or 'scale2x'
+# (smooths diagonals; only when SCALE is 2)
+SCALE_FILTER = 'nearest'
+# fades move in this many steps between black and full brightness;
+# 'gamma' fades with the display's gamma ramp where the driver allows
+# it, 'overlay' blends black over the screen
+FADE_LEVELS = 16
+FADE_MODE = 'overlay'
+
+# draw each room's tiles once into a background surface and repair
+# dirty areas from it
+PRERENDER_TILEMAPS = True
 
 FRAMES_PER_SECOND = 50
 TIMING_EPSILON = 0.00001
+# the simulation advances in fixed steps, independent of frame rate;
+# after a slow frame at most this many steps are run to catch up
+SIMULATION_DT = 1.0 / 50
+MAX_CATCHUP_STEPS = 5
+# frames summarized by the profiler overlay
+PROFILE_HISTORY = 200
 JOYSTICK_EPSILON = 0.01
 
+# slabs are read from this bundle when it exists; see bundle.py
+ASSET_BUNDLE = 'assets.bzab'
 SPLASH_IMAGE = 'splash.png'
 TITLE_IMAGE = 'title.png'
 IDLE_TIME_BEFORE_DEMO = 10
 DEMO_DURATION = 10
+# played back in attract mode if present; written by running with -record
+DEMO_REPLAY = 'demo.rpl'
 ENDGAME_IMAGE = 'splash.png'
 END_GAME_DISPLAY_TIME = 10
+# bytes of decoded slabs kept alive by the slab cache
+SLABCACHE_BUDGET = 8 << 20
 
 from pygame.locals import *
 KEY_BINDINGS = {
@@ -42,6 +66,20 @@ KEY_BINDINGS = {
 
 EPSILON = 0.0000001
 DAMPING = 0.75
+# integrate all actors of a room at once in NumPy arrays; falls back
+# to per-actor updates when NumPy is missing
+BATCH_PHYSICS = False
+
+# tiles a room's navigation field grows by per simulation step
+NAVIGATION_BUDGET = 64
+# scent and noise fields robots follow, stepped every SENSES_PERIOD
+# seconds; each is (diffusion, decay) per step, and robots ignore
+# fields fainter than SENSES_THRESHOLD.  Needs NumPy.
+SENSES = True
+SENSES_PERIOD = 0.1
+SCENT = (0.6, 0.95)
+NOISE = (0.8, 0.7)
+SENSES_THRESHOLD = 0.05
 
 #### GAME STUFF
 
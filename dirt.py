@@ -0,0 +1,46 @@
+
+from util import Rect
+
+class DirtyRegions:
+    """
+    Accumulates the rectangles smirched during a frame.  Repeated and
+    contained rectangles are dropped as they arrive; on flush,
+    overlapping or abutting rectangles are merged whenever their union
+    is no larger than the two areas added together.
+    """
+    def __init__(self):
+        (self.rects, self.seen) = ([], set())
+
+    def __len__(self): return len(self.rects)
+
+    def add(self, rect):
+        rect = Rect(rect)
+        key = tuple(rect)
+        if rect.w <= 0 or rect.h <= 0 or key in self.seen: return
+        self.seen.add(key)
+        for i in rect.collidelistall(self.rects):
+            if self.rects[i].contains(rect): return
+        self.rects.append(rect)
+
+    def flush(self):
+        merged = []
+        for rect in self.rects:
+            i = 0
+            while i < len(merged):
+                other = merged[i]
+                if _mergeable(rect, other):
+                    rect = rect.union(other)
+                    merged[i] = merged[-1]
+                    merged.pop()
+                    i = 0
+                else:
+                    i += 1
+            merged.append(rect)
+        (self.rects, self.seen) = ([], set())
+        return merged
+
+def _mergeable(a, b):
+    if a.left > b.right or b.left > a.right or a.top > b.bottom or b.top > a.bottom:
+        return False
+    u = a.union(b)
+    return u.w*u.h <= a.w*a.h + b.w*b.h
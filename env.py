@@ -1,14 +1,26 @@
-import logging
+import os, logging
 import pygame
 
-import config
+import config, dirt, profiler
 
 vbuffer = None
 display_sface = None
+_scaled_dim = None
+_scale_filter = None
 clock = None
-# FX
+# when set, update() reports this instead of waiting on the clock
+fixed_delta_t = None
+# FX: the current fade level, out of config.FADE_LEVELS, and whether
+# it changed since the last present
 _overlay = None
 _overlay_p = False
+_fade_level = None
+_fade_changed = False
+_gamma_p = False
+# regions of vbuffer changed this frame; only consulted if a state
+# reported any, otherwise the whole screen is presented
+_dirt = dirt.DirtyRegions()
+_partial_p = False
 # controller aspect
 quit_raised = False
 buttons = ['UP', 'DOWN', 'LEFT', 'RIGHT', 'FIRE', 'ESCAPE', 'DEBUG_TOGGLE']
@@ -18,20 +30,37 @@ tapped = dict().fromkeys(buttons, False)
 joysticks = []
 
 def init(options):
+    # headless runs draw into SDL's dummy driver and step time at a
+    # fixed rate, as fast as the simulation allows
+    if 'headless' in options:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        global fixed_delta_t
+        fixed_delta_t = 1.0 / config.FRAMES_PER_SECOND
     pygame.init()
     # clock for frame timing
     global clock
     clock = pygame.time.Clock()
     # init display
-    dim = config.VIRTUAL_DIMENSIONS
-    if config.SCALE != 1: dim = map(lambda x:config.SCALE*x, dim)
-    pygame.display.set_mode(dim, 0 if 'fullscreen' not in options else pygame.FULLSCREEN)
+    global _scaled_dim, _scale_filter
+    dim = _scaled_dim = tuple(config.SCALE*x for x in config.VIRTUAL_DIMENSIONS)
+    _scale_filter = config.SCALE_FILTER
+    if _scale_filter == 'scale2x' and config.SCALE != 2:
+        logging.warning('env: scale2x needs SCALE = 2; using nearest neighbour.')
+        _scale_filter = 'nearest'
+    # the dummy driver otherwise picks an 8-bit mode nothing converts to
+    depth = 32 if 'headless' in options else 0
+    pygame.display.set_mode(dim, 0 if 'fullscreen' not in options else pygame.FULLSCREEN, depth)
     pygame.mouse.set_visible(False)
     global vbuffer, display_sface, _overlay
     vbuffer = display_sface = pygame.display.get_surface()
     if config.SCALE != 1:
         vbuffer = pygame.Surface(config.VIRTUAL_DIMENSIONS, 0, vbuffer)
     _overlay = display_sface.copy()
+    _overlay.fill(0)
+    global _gamma_p
+    _gamma_p = config.FADE_MODE == 'gamma' and _set_gamma(1.0)
+    if config.FADE_MODE == 'gamma' and not _gamma_p:
+        logging.warning('env: Gamma ramps are unavailable; fading with an overlay.')
     # init joysticks
     if pygame.joystick.get_count() > 0:
         global joysticks
@@ -70,24 +99,78 @@ def _process_events():
             if state: tapped[bind] = state
             pressed[bind] = state
 
+def _set_gamma(amount):
+    ramp = [min(0xffff, int(i*257*amount)) for i in xrange(256)]
+    try:
+        return pygame.display.set_gamma_ramp(ramp, ramp, ramp)
+    except pygame.error:
+        return False
+
 def fade(amount):
-    global _overlay_p
-    if amount < 1.0-config.EPSILON:
-        _overlay.fill(0)
-        _overlay.set_alpha(255 * (1.0 - amount))
-        _overlay_p = True
+    global _overlay_p, _fade_level, _fade_changed
+    levels = config.FADE_LEVELS
+    level = max(0, min(levels, int(amount*levels + 0.5)))
+    if level == _fade_level: return
+    _fade_level = level
+    if _gamma_p:
+        _set_gamma(float(level)/levels)
+        return
+    _fade_changed = True
+    _overlay_p = level < levels
+    if _overlay_p: _overlay.set_alpha(255 * (levels-level) // levels)
+
+# Report areas of vbuffer drawn this frame.  A state that calls this
+# at all must report everything it draws.
+def smirch(*rects):
+    global _partial_p
+    _partial_p = True
+    for r in rects: _dirt.add(r)
+
+def smirched():
+    "The areas reported so far this frame, or None if the whole screen will be presented."
+    return list(_dirt.rects) if _partial_p else None
+
+# Enlarge the vbuffer rectangle R into the same area of the display,
+# returning that area.  scale2x output depends on each pixel's
+# neighbours, so a change spreads a pixel past R: it redoes R grown by
+# one, from a source grown by one more, and keeps only the middle.
+def _scale(r):
+    (s, screen) = (config.SCALE, vbuffer.get_rect())
+    if _scale_filter == 'scale2x': r = r.inflate(2,2)
+    r = r.clip(screen)
+    to = pygame.Rect(r.x*s, r.y*s, r.w*s, r.h*s)
+    if _scale_filter == 'scale2x':
+        source = r.inflate(2,2).clip(screen)
+        scaled = pygame.transform.scale2x(vbuffer.subsurface(source))
+        display_sface.blit(scaled, to, to.move(-source.x*s, -source.y*s))
     else:
-        _overlay_p = False
+        pygame.transform.scale(vbuffer.subsurface(r), to.size, display_sface.subsurface(to))
+    # dirty areas may overlap, so blend each as soon as it is redone
+    if _overlay_p: display_sface.blit(_overlay, to, to)
+    return to
 
+# While the fade level holds still, only the dirty areas are redone.
 def update():
-    if config.SCALE != 1:
-        pygame.transform.scale(vbuffer, map(lambda x:config.SCALE*x, config.VIRTUAL_DIMENSIONS),
-                               display_sface)
-    if _overlay_p: display_sface.blit(_overlay, (0,0))
-    pygame.display.flip()
+    global _partial_p, _fade_changed
+    p = profiler.enabled
+    if p: t = profiler.now()
+    rects = _dirt.flush()
+    if _fade_changed or not _partial_p or (_overlay_p and config.SCALE == 1): rects = None
+    _partial_p = _fade_changed = False
+    if rects is None:
+        if config.SCALE != 1: _scale(vbuffer.get_rect())
+        elif _overlay_p: display_sface.blit(_overlay, (0,0))
+        pygame.display.flip()
+    elif rects:
+        if config.SCALE != 1: rects = [_scale(r) for r in rects]
+        pygame.display.update(rects)
     global vbuffer_valid
     vbuffer_valid = True
+    if p: t = profiler.lap('present', t)
     _process_events()
+    if p: profiler.lap('events', t)
+    profiler.end_frame()
+    if fixed_delta_t is not None: return fixed_delta_t
     clock.tick(config.FRAMES_PER_SECOND)
     return clock.get_time() / 1000.0
 
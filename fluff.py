@@ -8,6 +8,3 @@ class SplashState(State):
 
     def update(self, delta_t):
         env.vbuffer.blit(self.splash, (0,0))
-
-    def __del__(self):
-        slabcache.wipe(config.SPLASH_IMAGE)
@@ -1,16 +1,29 @@
 
+import pygame, collections
 import slabcache, env
 from util import Rect
 
 class TroglodyteFont:
-    def __init__(self, path=None, char_size=(8,8)):
+    def __init__(self, path=None, char_size=(8,8), cache_size=64):
         self.slab = slabcache.load(path, alpha_p = True)
         self.char_size = char_size
+        # rendered strings, least recently used first
+        (self.cache, self.cache_size) = (collections.OrderedDict(), cache_size)
+
+    def render(self, string):
+        try:
+            sface = self.cache.pop(string)
+        except KeyError:
+            if len(self.cache) >= self.cache_size: self.cache.popitem(last=False)
+            (w,h) = self.char_size
+            sface = pygame.Surface((w*len(string), h), pygame.SRCALPHA, self.slab)
+            # sface starts fully transparent, so taking the maximum copies
+            # each glyph's pixels, alpha included
+            for (x,c) in enumerate(string):
+                i = min(max(ord(c)-ord(' '), 0), 95)
+                sface.blit(self.slab, (x*w,0), (i*w, 0, w, h), pygame.BLEND_RGBA_MAX)
+        self.cache[string] = sface
+        return sface
 
     def blit(self, string, dest):
-        (x,y) = dest
-        for c in string:
-            i = min(max(ord(c)-ord(' '), 0), 95)
-            env.vbuffer.blit(self.slab, (x,y),
-                             (i*self.char_size[0], 0, self.char_size[0], self.char_size[1]))
-            x += self.char_size[0]
+        return env.vbuffer.blit(self.render(string), dest)
@@ -0,0 +1,41 @@
+
+import env
+from util import Rect
+
+class Hud:
+    """
+    Text fields over a solid strip of the screen.  A field is redrawn
+    only when the value given for it changes; draw() returns the areas
+    it touched, which are empty in the steady state.
+    """
+    def __init__(self, font, area, background=0):
+        (self.font, self.area, self.background) = (font, Rect(area), background)
+        self.fields = {}
+        self.invalidate()
+
+    # FORMAT is a format string or a function of the value
+    def field(self, name, position, format='%s'):
+        self.fields[name] = [position, format, None, None, None]
+
+    def set(self, name, value):
+        self.fields[name][2] = value
+
+    def invalidate(self):
+        self.stale = True
+
+    def draw(self):
+        dirt = []
+        if self.stale:
+            env.vbuffer.fill(self.background, self.area)
+            dirt.append(self.area)
+        for f in self.fields.itervalues():
+            (position, format, value, shown, drawn) = f
+            if not self.stale and value == shown: continue
+            if drawn is not None and not self.stale:
+                env.vbuffer.fill(self.background, drawn)
+                dirt.append(drawn)
+            text = format % value if isinstance(format, str) else format(value)
+            f[3:] = [value, self.font.blit(text, position)]
+            dirt.append(f[4])
+        self.stale = False
+        return dirt
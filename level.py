@@ -0,0 +1,136 @@
+"""
+Binary level format.  A level file starts with a header and an index
+of rooms; each room is decoded only when it is first asked for, from
+a memory map of the file, so opening a level costs the same whatever
+its size.  All integers are little-endian.
+
+    header      'BZLV', u16 version, u16 room count
+    index       per room: u32 offset, u32 length
+    room        u16 w, u16 h
+                u8 length + slab file name
+                u8 typecode ('B' or 'H') + w*h map entries
+                u16 count + (u16 tile, u16 properties) pairs
+                u16 count + (u8 length + archetype, s16 x, s16 y)
+                u16 count + (u8 facing, u16 room) connections
+
+A connection leads out of the room across the border the humanoid
+collides with (a util.Facing value) into another room of the level.
+
+Older pickled levels are still read, in full, through the same
+interface.  To convert one:
+
+    python level.py test-level-1.lev test-level-1.bzl
+"""
+import sys, struct, mmap, array, cPickle, logging
+
+MAGIC = 'BZLV'
+VERSION = 1
+_header = struct.Struct('<4sHH')
+_index_entry = struct.Struct('<II')
+
+_open = {}
+
+def load(path):
+    "Opens the level at PATH, reusing it if it is already open."
+    if path not in _open:
+        with open(path, 'rb') as f:
+            binary_p = f.read(len(MAGIC)) == MAGIC
+        _open[path] = (BinaryLevel if binary_p else PickledLevel)(path)
+    return _open[path]
+
+class BinaryLevel:
+    def __init__(self, path):
+        logging.debug('level: Mapping "%s".' % path)
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, count) = _header.unpack_from(self.data, 0)
+        assert magic == MAGIC
+        if version != VERSION: raise ValueError('%s: unsupported level version %d' % (path, version))
+        self.index = [_index_entry.unpack_from(self.data, _header.size + i*_index_entry.size)
+                      for i in xrange(count)]
+        self.rooms = {}
+
+    def __len__(self): return len(self.index)
+
+    def room(self, i):
+        if i not in self.rooms:
+            (offset, length) = self.index[i]
+            self.rooms[i] = _decode_room(self.data[offset:offset+length])
+        return self.rooms[i]
+
+class PickledLevel:
+    def __init__(self, path):
+        logging.debug('level: Unpickling "%s".' % path)
+        with open(path) as f:
+            level = cPickle.load(f)
+        assert level['magic'] == 'Berzerk'
+        self.rooms = level['rooms']
+
+    def __len__(self): return len(self.rooms)
+
+    def room(self, i): return self.rooms[i]
+
+class _Reader:
+    def __init__(self, data): (self.data, self.at) = (data, 0)
+
+    def unpack(self, fmt):
+        values = struct.unpack_from(fmt, self.data, self.at)
+        self.at += struct.calcsize(fmt)
+        return values
+
+    def string(self):
+        (n,) = self.unpack('<B')
+        self.at += n
+        return self.data[self.at-n:self.at]
+
+def _decode_room(data):
+    r = _Reader(data)
+    (w, h) = r.unpack('<HH')
+    slab = r.string()
+    (typecode,) = r.unpack('<c')
+    tiles = array.array(typecode)
+    tiles.fromstring(data[r.at:r.at + w*h*tiles.itemsize])
+    if sys.byteorder != 'little': tiles.byteswap()
+    r.at += w*h*tiles.itemsize
+    (n,) = r.unpack('<H')
+    properties = dict(r.unpack('<HH') for _ in xrange(n))
+    (n,) = r.unpack('<H')
+    actors = [(name, r.unpack('<hh')) for name in (r.string() for _ in xrange(n))]
+    (n,) = r.unpack('<H')
+    connections = [r.unpack('<BH') for _ in xrange(n)]
+    return {'dim': (w,h), 'slab': slab, 'map': tiles, 'tile properties': properties,
+            'actors': actors, 'connections': connections}
+
+def _encode_room(room):
+    (w, h) = room['dim']
+    tiles = array.array('B' if max(room['map']) < 256 else 'H', room['map'])
+    if sys.byteorder != 'little': tiles.byteswap()
+    out = [struct.pack('<HH', w, h),
+           struct.pack('<B', len(room['slab'])), room['slab'],
+           struct.pack('<c', tiles.typecode), tiles.tostring(),
+           struct.pack('<H', len(room['tile properties']))]
+    out += [struct.pack('<HH', t, p) for (t,p) in sorted(room['tile properties'].items())]
+    out.append(struct.pack('<H', len(room['actors'])))
+    for (name, (x,y)) in room['actors']:
+        out += [struct.pack('<B', len(name)), name, struct.pack('<hh', x, y)]
+    out.append(struct.pack('<H', len(room['connections'])))
+    out += [struct.pack('<BH', facing, to) for (facing, to) in room['connections']]
+    return ''.join(out)
+
+def write(path, rooms):
+    "Writes ROOMS, a list of room dicts as found in pickled levels, in the binary format."
+    encoded = [_encode_room(room) for room in rooms]
+    offset = _header.size + len(encoded)*_index_entry.size
+    with open(path, 'wb') as f:
+        f.write(_header.pack(MAGIC, VERSION, len(encoded)))
+        for data in encoded:
+            f.write(_index_entry.pack(offset, len(data)))
+            offset += len(data)
+        for data in encoded: f.write(data)
+
+def convert(source, destination):
+    level = PickledLevel(source)
+    write(destination, [level.room(i) for i in xrange(len(level))])
+
+if __name__ == '__main__':
+    convert(sys.argv[1], sys.argv[2])
@@ -1,10 +1,18 @@
 
-import sys, os, math, random, operator, cPickle
+import sys, os, math, random, operator
 
-import config, env, slabcache, fluff, transition, font, room
+import config, env, slabcache, fluff, transition, font, room, level, hud, actor, profiler, replay, streamer
 from util import *
 
-levels = ['test-level-1.lev']
+levels = ['test-level-1.bzl']
+# when set, new games record their input here
+recording = None
+
+def level_slabs(level_number):
+    "The slabs a GameState for LEVEL_NUMBER will load, for prefetching."
+    slabs = set(archetype['slab'] for archetype in actor.archetypes.itervalues())
+    slabs.add(level.load(levels[level_number-1]).room(0)['slab'])
+    return slabs
 
 class PlayerState():
     def __init__(self):
@@ -30,63 +38,117 @@ class EndGameState(State):
         return self
 
 class GameState(State):
-    def __init__(self, level_number=1, player_state=None, **kwds):
+    def __init__(self, level_number=1, player_state=None, recorder=None, **kwds):
         self.player = player_state or PlayerState()
+        self.recorder = recorder
         self.current_level = level_number-1
-        self.current_room = 0
-        # try to load a level
-        with open(levels[self.current_level]) as f:
-            level = cPickle.load(f)
-        assert level['magic'] == 'Berzerk'
-        self.room = room.Room(parent=self, room=level['rooms'][0])
+        # the border the humanoid crossed this step, if any
+        self.escaped = None
+        self.enter_room(0)
+        if self.current_level+1 < len(levels):
+            slabcache.prefetch(level_slabs(self.current_level+2))
+            streamer.prepare(levels[self.current_level+1], 0)
+        else:
+            slabcache.prefetch([config.ENDGAME_IMAGE])
         self.font = font.TroglodyteFont('megafont.png')
+        self.hud = hud.Hud(self.font, (0,208,320,32))
+        self.hud.field('score', (10,220), '%08d')
+        self.hud.field('location', (10,228), 'Level %s / Room %s')
+        self.hud.field('lives', (200,220), lambda n: 'Lives: %s' % ('*' * n))
         # debug
         self.debug_toggle = False
         (self.paused,self.transition_p) = (False,False)
 
+    # Rooms reachable from the one entered are prepared in the
+    # background, so moving into them does not stall.
+    def enter_room(self, index):
+        path = levels[self.current_level]
+        self.room = room.Room(parent=self, room=level.load(path).room(index),
+                              prepared=streamer.take(path, index))
+        self.current_room = index
+        for (_, to) in self.room.room['connections']: streamer.prepare(path, to)
+
     def humanoid_has_died(self):
         logging.debug('Humanoid has died.')
         self.player.lives -= 1
         if self.player.lives < 1:
+            self.stop_recording()
             (self.paused,self.transition_p,self.next_state) = (True,True,transition.FadeOutIn(out_from=self, in_to=TitleState()))
 
+    # The room is left only once it has finished its step, so nothing
+    # later in that step runs against the room entered.
     def humanoid_escapes(self, border):
+        if self.escaped is None: self.escaped = border
+
+    def leave_room(self, border):
         logging.debug('Escaped via border %s' % border)
+        to = dict(self.room.room['connections']).get(border)
+        if to is not None:
+            self.enter_room(to)
+            # the room left behind slides off past the border crossed
+            (self.transition_p,self.next_state) = (True,transition.SlideIn(atop=self, after=self, facing=Facing.opposite(border)))
+            return
+        self.stop_recording()
         if self.current_level+1 < len(levels):
-            state = GameState(level_number = self.current_level+1, player_state = self.player)
+            state = GameState(level_number = self.current_level+2, player_state = self.player)
         else:
             state = EndGameState(player_state = self.player)
         (self.paused,self.transition_p,self.next_state) = (True,True,transition.FadeOutIn(out_from=self, in_to=state))
 
+    # a replay starts from one level's seed and plays that level only,
+    # so recording ends with the level
+    def stop_recording(self):
+        if self.recorder is not None: self.recorder.close()
+
     def score_points(self, achievement):
         points = {'killed robot':100,}[achievement]
         logging.debug('scored %s points for %s' % (points, achievement))
         self.player.score += points
 
     def update(self, delta_t):
+        if self.recorder is not None: self.recorder.capture(delta_t)
         if not self.paused:
             self.room.update(delta_t)
-        env.vbuffer.fill(0,(0,208,320,32))
-        self.font.blit('%08d' % self.player.score, (10,220))
-        self.font.blit('Level %s / Room %s' % (1+self.current_level, 1+self.current_room), (10,228))
-        self.font.blit('Lives: %s' % ('*' * self.player.lives), (200,220))
+            if self.escaped is not None:
+                (border, self.escaped) = (self.escaped, None)
+                if not self.paused: self.leave_room(border)
         if env.tapped['DEBUG_TOGGLE']:
             self.debug_toggle = not self.debug_toggle
-        if self.debug_toggle:
-            for actor in self.room.actors:
-                env.debug_rect(actor.rect, 0xffff00)
-                env.debug_rect(actor.collision_rect.move(actor.rect.left, actor.rect.top), 0xff0000)
-        if env.tapped['ESCAPE']: return TitleState()
+            profiler.show(self.debug_toggle)
+        if env.tapped['ESCAPE']:
+            self.stop_recording()
+            return TitleState()
         if self.transition_p:
             self.transition_p = False
             return self.next_state
         return self
 
+    def draw(self, alpha):
+        self.room.draw(alpha)
+        self.hud.set('score', self.player.score)
+        self.hud.set('location', (1+self.current_level, 1+self.current_room))
+        self.hud.set('lives', self.player.lives)
+        env.smirch(*self.hud.draw())
+        if self.debug_toggle:
+            env.smirch(env.vbuffer.get_rect())
+            for actor in self.room.actors:
+                env.debug_rect(actor.rect, 0xffff00)
+                env.debug_rect(actor.collision_rect.move(actor.rect.left, actor.rect.top), 0xff0000)
+            # the room repairs what the overlay covered next frame
+            self.room.smirch(profiler.draw_overlay(self.font, (4,4)))
+
+    def expose(self, rect):
+        self.room.smirch(rect)
+        if self.hud.area.colliderect(rect): self.hud.invalidate()
+
 class TitleState(State):
     def __init__(self, **kwds):
         State.__init__(self, **kwds)
         # XXX title state can be a singleton; cache resources and so on after the first time
         self.title = slabcache.load(config.TITLE_IMAGE)
+        # the first room too, so that starting does not build it on the main thread
+        slabcache.prefetch(level_slabs(1))
+        streamer.prepare(levels[0], 0)
         (self.accumulated_t, self.paused) = (0, False)
         self.font = font.TroglodyteFont('megafont.png')
         self.selected = 0
@@ -102,7 +164,10 @@ class TitleState(State):
                 self.font.blit(pointers[int(self.accumulated_t/0.1%len(pointers))], (145,200+10*i))
 
     def start_new_game(self):
-        return transition.FadeOutIn(out_from=self, in_to=GameState(level_number=1))
+        seed = random.randrange(1<<32)
+        random.seed(seed)
+        recorder = replay.Recorder(recording, seed) if recording else None
+        return transition.FadeOutIn(out_from=self, in_to=GameState(level_number=1, recorder=recorder))
 
     def update(self, delta_t):
         self.accumulated_t += delta_t
@@ -123,17 +188,74 @@ class TitleState(State):
         return self
 
 class DemoState(State):
+    "Attract mode: plays back config.DEMO_REPLAY, if there is one."
     def __init__(self, **kwds):
         State.__init__(self, **kwds)
         self.accumulated_t = 0
+        (self.replay, self.game) = (None, None)
+        if os.path.exists(config.DEMO_REPLAY):
+            self.replay = replay.Player(config.DEMO_REPLAY)
+            random.seed(self.replay.seed)
+            self.game = GameState(level_number=self.replay.level_number)
 
     def update(self, delta_t):
         self.accumulated_t += delta_t
-        env.vbuffer.fill(0x42aace)
         if any(env.tapped.values()) or self.accumulated_t > config.DEMO_DURATION:
-            return transition.Fade(start=0.0, end=1.0, atop=TitleState())
+            return self.leave()
+        if self.game is None:
+            env.vbuffer.fill(0x42aace)
+            return self
+        # the replay stands in for the controls only while the game
+        # updates, so a real key press still ends the demo
+        (pressed, tapped) = (env.pressed.copy(), env.tapped.copy())
+        replayed_t = self.replay.feed()
+        game = self.game.update(replayed_t) if replayed_t is not None else None
+        env.pressed.update(pressed)
+        env.tapped.update(tapped)
+        if game is not self.game:
+            return self.leave()
         return self
 
+    def leave(self):
+        title = TitleState()
+        return transition.Fade(start=0.0, end=1.0, atop=title, after=title)
+
+    def draw(self, alpha):
+        if self.game is not None: self.game.draw(alpha)
+
+    def expose(self, rect):
+        if self.game is not None: self.game.expose(rect)
+
+class Simulation:
+    """
+    Fixed-step driver: each displayed frame, runs as many whole steps
+    of config.SIMULATION_DT as the elapsed time covers (dropping the
+    backlog past config.MAX_CATCHUP_STEPS), then draws the resulting
+    state interpolated by the leftover fraction of a step.  Each tap is
+    seen by exactly one step: held over frames that run none, and
+    cleared after the first step of frames that run several.
+    """
+    def __init__(self, state):
+        (self.state, self.accumulator) = (state, 0.0)
+        self.held = dict.fromkeys(env.buttons, False)
+
+    def advance(self, delta_t):
+        dt = config.SIMULATION_DT
+        self.accumulator += delta_t
+        for b in env.buttons: self.held[b] = env.tapped[b] = self.held[b] or env.tapped[b]
+        steps = 0
+        while self.state and self.accumulator + config.TIMING_EPSILON >= dt:
+            self.state = self.state.update(dt)
+            if steps == 0:
+                for b in env.buttons: self.held[b] = env.tapped[b] = False
+            self.accumulator -= dt
+            steps += 1
+            if steps == config.MAX_CATCHUP_STEPS:
+                self.accumulator %= dt
+                break
+        if self.state: self.state.draw(max(0.0, self.accumulator / dt))
+        return self.state
+
 import logging
 def main():
     if '-debug' in sys.argv:
@@ -141,14 +263,18 @@ def main():
     random.seed()
     options = set()
     if '-fs' in sys.argv: options.add('fullscreen')
+    if '-profile' in sys.argv: profiler.export('profile.csv')
+    if '-record' in sys.argv:
+        global recording
+        recording = config.DEMO_REPLAY
     env.init(options)
+    if os.path.exists(config.ASSET_BUNDLE): slabcache.mount(config.ASSET_BUNDLE)
     state = TitleState()
     if not '-fast' in sys.argv:
         state = transition.FadeInOut(hold_duration=2, atop=fluff.SplashState(),
                                      after=transition.Fade(atop=state, after=state, duration=2.0, start=0.0, end=1.0))
 
-    while state and not env.quit_raised:
-        delta_t = env.update()
-        if delta_t >= config.TIMING_EPSILON:
-            state = state.update(delta_t)
+    simulation = Simulation(state)
+    while simulation.state and not env.quit_raised:
+        simulation.advance(env.update())
 if __name__ == '__main__': main()
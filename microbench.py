@@ -0,0 +1,149 @@
+"""
+Microbenchmarks for the code that runs every frame.  Everything is
+built from synthetic surfaces and maps under SDL's dummy driver, so no
+assets are needed, and each case is run at a few room sizes and actor
+counts.  Times are the best of several repeats, in microseconds per
+call.
+
+    python microbench.py [-only SUBSTRING] [-save FILE]
+                         [-compare FILE] [-threshold FRACTION]
+
+-save writes the results as a JSON baseline; -compare checks against
+one and exits nonzero if any case got slower by more than its
+threshold (the baseline's, else -threshold, default 0.1).  Baselines
+depend on the machine, so keep them out of the tree.
+"""
+import sys, os, json, random, tempfile, timeit
+
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+import pygame
+import config, env, util, tilemap, sprite, font, room, actor
+from util import Rect
+
+ROOM_SIZES = ((20,13), (40,26))
+ACTOR_COUNTS = (10, 50)
+REPEAT = 5
+
+_scratch = tempfile.mkdtemp(prefix='microbench')
+
+def _slab(name, size, paint):
+    "A synthetic slab saved where slabcache can load it; PAINT fills it in."
+    surface = pygame.Surface(size, pygame.SRCALPHA, 32)
+    paint(surface)
+    path = os.path.join(_scratch, name)
+    pygame.image.save(surface, path)
+    return path
+
+def _tiles(surface):
+    surface.fill((40,40,40,255), (0,0,16,16))
+    surface.fill((200,120,0,255), (16,0,16,16))
+
+def _glyphs(surface):
+    for i in xrange(0, surface.get_width(), 8): surface.fill((255,255,255,255), (i+1,1,6,6))
+
+def _sprites(surface):
+    surface.fill((0,200,0,255))
+
+def synthetic_room(dim, rng):
+    "A room dict of size DIM with walls on the border and scattered inside."
+    (w,h) = dim
+    tiles = [1 if x in (0,w-1) or y in (0,h-1) or rng.random() < 0.15 else 0
+             for y in xrange(h) for x in xrange(w)]
+    return {'dim': dim, 'slab': _slab('tiles.png', (32,16), _tiles), 'map': tiles,
+            'tile properties': {0: tilemap.PASSABLE, 1: 0}, 'actors': [], 'connections': []}
+
+class _Parent:
+    def humanoid_escapes(self, facing): pass
+    def humanoid_has_died(self): pass
+    def score_points(self, achievement): pass
+
+def _synthetic_atlases():
+    "Gives every archetype frames cut from a synthetic slab, before anything loads the real one."
+    slab = pygame.image.load(_slab('sprites.png', (96,32), _sprites)).convert_alpha()
+    for archetype in actor.archetypes.itervalues():
+        archetype['atlas'] = (sprite.compile_frames(slab, archetype['animations']),
+                              Rect(archetype['collision rectangle']))
+
+def populated_room(dim, count, rng):
+    r = room.Room(parent=_Parent(), room=synthetic_room(dim, rng))
+    cells = [i for (i,p) in enumerate(r.tilemap.passable) if p]
+    for _ in xrange(count):
+        i = rng.choice(cells)
+        r.spawn('robot', (((i % r.tilemap.w) << 4) + 8, ((i // r.tilemap.w) << 4) + 8))
+    return r
+
+def cases():
+    "Yields (name, function to time, calls per timing)."
+    rng = random.Random(0)
+    _synthetic_atlases()
+    for dim in ROOM_SIZES:
+        label = '%dx%d' % dim
+        synthetic = synthetic_room(dim, rng)
+        t = tilemap.SimpleTilemap(pygame.image.load(synthetic['slab']).convert(), synthetic['map'], dim)
+        yield ('tilemap.draw full %s' % label, lambda t=t: t.draw((0,0), env.vbuffer.get_rect()), 20)
+        yield ('tilemap.draw 32x32 %s' % label, lambda t=t: t.draw((0,0), Rect(40,40,32,32)), 200)
+        t.prerender()
+        yield ('tilemap.draw prerendered %s' % label, lambda t=t: t.draw((0,0), env.vbuffer.get_rect()), 200)
+        for count in ACTOR_COUNTS:
+            r = populated_room(dim, count, rng)
+            name = '%s %d actors' % (label, count)
+            yield ('room.check_tile_collision %s' % name,
+                   lambda r=r: [r.check_tile_collision(a) for a in r.actors], 50)
+            yield ('room.check_actor_collisions %s' % name, r.check_actor_collisions, 50)
+    (frames, _) = actor.archetypes['shot']['atlas']
+    for count in ACTOR_COUNTS:
+        sprites = [sprite.Sprite(frames=frames, position=(rng.randrange(300), rng.randrange(220)))
+                   for _ in xrange(count)]
+        yield ('sprite.update %d sprites' % count, lambda s=sprites: [x.update(0.02) for x in s], 200)
+        yield ('sprite.draw %d sprites' % count, lambda s=sprites: [x.draw() for x in s], 200)
+    f = font.TroglodyteFont(_slab('font.png', (8*128,8), _glyphs))
+    yield ('font.blit cached', lambda: f.blit('Score: 00001200', (10,10)), 500)
+    strings = ['%08d' % i for i in xrange(4096)]
+    yield ('font.blit uncached', lambda: f.blit(strings[rng.randrange(len(strings))], (10,10)), 200)
+    values = [rng.uniform(-100, 100) for _ in xrange(1000)]
+    yield ('util.damp 1000 values', lambda: [util.damp(v, config.DAMPING) for v in values], 50)
+    def present(rects):
+        if rects: env.smirch(*rects)
+        env.update()
+    yield ('env.update full frame', lambda: present(None), 50)
+    small = [Rect(rng.randrange(300), rng.randrange(200), 20, 25) for _ in xrange(10)]
+    yield ('env.update 10 sprite rects', lambda: present(small), 200)
+
+def run(only=None):
+    results = {}
+    for (name, fn, number) in cases():
+        if only and only not in name: continue
+        best = min(timeit.repeat(fn, number=number, repeat=REPEAT)) / number
+        results[name] = 1e6 * best
+        print '%-50s %10.1f us' % (name, results[name])
+    return results
+
+def compare(results, baseline, threshold):
+    "Prints each case against BASELINE; returns the names that regressed."
+    regressed = []
+    for (name, us) in sorted(results.iteritems()):
+        if name not in baseline: continue
+        entry = baseline[name]
+        limit = entry.get('threshold', threshold)
+        ratio = us / entry['us']
+        flag = 'REGRESSED' if ratio > 1+limit else ''
+        if flag: regressed.append(name)
+        print '%-50s %6.2fx %s' % (name, ratio, flag)
+    return regressed
+
+def _arg(name, default, kind=str):
+    if name not in sys.argv: return default
+    return kind(sys.argv[sys.argv.index(name)+1])
+
+if __name__ == '__main__':
+    env.init(set(['headless']))
+    results = run(_arg('-only', None))
+    threshold = _arg('-threshold', 0.1, float)
+    if '-save' in sys.argv:
+        with open(_arg('-save', None), 'w') as f:
+            json.dump(dict((name, {'us': us, 'threshold': threshold}) for (name, us) in results.iteritems()),
+                      f, indent=1, sort_keys=True)
+    if '-compare' in sys.argv:
+        with open(_arg('-compare', None)) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, threshold): sys.exit(1)
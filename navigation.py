@@ -0,0 +1,103 @@
+
+import array, collections
+import config
+from util import Facing
+
+UNREACHABLE = 0xffff
+_NOWHERE = 0xff
+
+class FlowField:
+    """
+    Shared navigation for a room: a breadth-first distance map over
+    the passability grid, grown outward from a goal cell, plus for
+    every reached cell the Facing that leads one cell closer to it.
+    Any number of hunters read their next step in O(1).
+
+    Hunters may be bigger than a tile, so a cell (x,y) is the block of
+    tiles from (x,y) big enough for a box of SIZE pixels, and only cells
+    whose tiles are all passable are walked.  Moving between the centres
+    of two such cells never touches a wall.
+
+    When the goal moves, a new field is grown a bounded number of
+    cells per update() so the cost is spread across frames; queries
+    keep answering from the last complete field in the meantime.  A
+    field underway is always finished, and only then is one started
+    toward wherever the goal has got to, so fields keep completing
+    however fast the goal moves.
+    """
+    def __init__(self, tilemap, size=None, budget=None):
+        (self.w, self.h, self.passable) = (tilemap.w, tilemap.h, tilemap.passable)
+        (self.tile_dim, self.tile_dim_pot) = (tilemap.tile_dim, tilemap.tile_dim_pot)
+        (sw, sh) = size or (tilemap.tile_dim, tilemap.tile_dim)
+        self.span = (-(-sw // self.tile_dim), -(-sh // self.tile_dim))
+        # how far a box at a cell's centre may stray across before it touches the block's edge
+        self.slack = min(k*self.tile_dim - s for (k,s) in zip(self.span, (sw,sh))) / 2.0
+        (kx, ky) = self.span
+        self.fits = bytearray(self.w*self.h)
+        for y in xrange(self.h-ky+1):
+            for x in xrange(self.w-kx+1):
+                self.fits[x + y*self.w] = all(self.passable[i + j*self.w]
+                                              for j in xrange(y, y+ky) for i in xrange(x, x+kx))
+        self.budget = budget or config.NAVIGATION_BUDGET
+        (self.goal, self.distance, self.facing) = (None, None, None)
+        (self.wanted, self._job) = (None, None)
+
+    def cell_of(self, point):
+        "The cell whose centre is nearest the pixel POINT."
+        (px, py) = point
+        ((kx, ky), td, tshift) = (self.span, self.tile_dim, self.tile_dim_pot)
+        return (max(0, min(self.w-kx, (px - ((kx-1)*td >> 1)) >> tshift)),
+                max(0, min(self.h-ky, (py - ((ky-1)*td >> 1)) >> tshift)))
+
+    def centre(self, cell):
+        "The pixel centre of CELL."
+        (x, y) = cell
+        ((kx, ky), td) = (self.span, self.tile_dim)
+        return ((x*td) + (kx*td >> 1), (y*td) + (ky*td >> 1))
+
+    def seek(self, goal):
+        "Asks for a field toward GOAL, a cell (x,y)."
+        (x,y) = goal
+        if 0 <= x < self.w and 0 <= y < self.h: self.wanted = goal
+
+    def _start(self, goal):
+        (x,y) = goal
+        i = x + y*self.w
+        distance = array.array('H', [UNREACHABLE]) * (self.w*self.h)
+        facing = bytearray([_NOWHERE]) * (self.w*self.h)
+        distance[i] = 0
+        self._job = (goal, collections.deque([i]), distance, facing)
+
+    def update(self):
+        if self._job is None:
+            if self.wanted is None or self.wanted == self.goal: return
+            self._start(self.wanted)
+        (goal, frontier, distance, facing) = self._job
+        (w, h, fits) = (self.w, self.h, self.fits)
+        for _ in xrange(self.budget):
+            if not frontier:
+                (self.goal, self.distance, self.facing) = (goal, distance, facing)
+                self._job = None
+                return
+            i = frontier.popleft()
+            (x, y, d) = (i % w, i // w, distance[i]+1)
+            for (f,(dx,dy)) in enumerate(Facing.offsets):
+                (nx, ny) = (x-dx, y-dy)
+                if not (0 <= nx < w and 0 <= ny < h): continue
+                n = nx + ny*w
+                if distance[n] != UNREACHABLE or not fits[n]: continue
+                # stepping along f from n leads back to i
+                (distance[n], facing[n]) = (d, f)
+                frontier.append(n)
+
+    def distance_from(self, cell):
+        (x,y) = cell
+        if self.distance is None or not (0 <= x < self.w and 0 <= y < self.h): return UNREACHABLE
+        return self.distance[x + y*self.w]
+
+    def direction(self, cell):
+        "The Facing to step in from CELL toward the goal, or None."
+        (x,y) = cell
+        if self.facing is None or not (0 <= x < self.w and 0 <= y < self.h): return None
+        f = self.facing[x + y*self.w]
+        return None if f == _NOWHERE else f
@@ -0,0 +1,48 @@
+
+import logging
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+available = numpy is not None
+
+class Batch:
+    """
+    Struct-of-arrays storage for the motion state of every actor in a
+    room.  Actors hold a slot index and read their position and
+    velocity through the arrays, so the batch may grow underneath
+    them.  Free slots keep a zero velocity and are integrated along
+    with the rest rather than masked out.
+    """
+    def __init__(self, capacity=64):
+        self.position = numpy.zeros((capacity,2))
+        self.velocity = numpy.zeros((capacity,2))
+        self.free = range(capacity-1, -1, -1)
+
+    def _grow(self):
+        n = len(self.position)
+        logging.debug('physics: Growing batch to %d slots.' % (2*n))
+        self.position = numpy.concatenate((self.position, numpy.zeros((n,2))))
+        self.velocity = numpy.concatenate((self.velocity, numpy.zeros((n,2))))
+        self.free = range(2*n-1, n-1, -1)
+
+    def add(self, position, velocity):
+        if not self.free: self._grow()
+        slot = self.free.pop()
+        (self.position[slot], self.velocity[slot]) = (position, velocity)
+        return slot
+
+    def remove(self, slot):
+        self.position[slot] = self.velocity[slot] = 0
+        self.free.append(slot)
+
+    # Vectorized equivalent of Actor.update_motion's per-actor
+    # position update followed by util.damp on each component.
+    def integrate(self, factor, epsilon=0.0000001):
+        self.position += self.velocity
+        v = self.velocity
+        a = v*factor
+        v[...] = numpy.where(numpy.abs(v) <= numpy.abs(a), 0, v - numpy.copysign(a, v))
+        v[numpy.abs(v) <= epsilon] = 0
@@ -0,0 +1,77 @@
+"""
+Per-phase frame timing.  Hot paths take a timestamp when the profiler
+is enabled and charge the time since the previous one to a phase with
+lap(); end_frame() closes the frame, keeps it in a rolling window for
+the overlay and, if exporting, writes it as a CSV row in milliseconds.
+When disabled, the only cost is testing the enabled flag.
+"""
+import timeit, collections
+from util import Rect
+import config, env
+
+now = timeit.default_timer
+phases = ('ai', 'motion', 'act', 'border', 'tiles', 'actors', 'sweep', 'draw', 'present', 'events')
+
+enabled = False
+(_showing, _export) = (False, None)
+_frame = dict.fromkeys(phases, 0.0)
+_frame_number = 0
+history = collections.deque(maxlen=config.PROFILE_HISTORY)
+
+def _update_enabled():
+    global enabled
+    enabled = _showing or _export is not None
+
+def show(flag):
+    global _showing
+    _showing = flag
+    _update_enabled()
+
+def export(path):
+    global _export
+    _export = open(path, 'w')
+    _export.write(','.join(('frame',) + phases) + '\n')
+    _update_enabled()
+
+def lap(phase, since):
+    t = now()
+    _frame[phase] += t - since
+    return t
+
+def end_frame():
+    global _frame_number
+    if not enabled: return
+    row = tuple(_frame[p] for p in phases)
+    history.append(row)
+    if _export is not None:
+        _export.write('%d,%s\n' % (_frame_number, ','.join('%.4f' % (1000*x) for x in row)))
+    _frame_number += 1
+    for p in phases: _frame[p] = 0.0
+
+def summary():
+    "Per phase (name, min, average, 99th percentile) in seconds over the window."
+    if not history: return []
+    columns = zip(*history)
+    out = []
+    for (name, column) in zip(phases, columns):
+        ordered = sorted(column)
+        out.append((name, ordered[0], sum(ordered)/len(ordered),
+                    ordered[min(len(ordered)-1, int(0.99*len(ordered)))]))
+    return out
+
+def draw_overlay(font, position, graph_height=24):
+    "Draws the rolling summary and a graph of frame totals; returns the area covered."
+    (x,y) = position
+    (cw,ch) = font.char_size
+    rows = summary()
+    area = Rect(x, y, cw*30, ch*(len(rows)+1) + graph_height + 2)
+    env.vbuffer.fill(0, area)
+    font.blit('phase    min   avg   p99 ms', (x,y))
+    for (i, (name, lo, avg, p99)) in enumerate(rows):
+        font.blit('%-7s%5.2f %5.2f %5.2f' % (name, 1000*lo, 1000*avg, 1000*p99), (x, y+ch*(i+1)))
+    # one column per frame, full height at the frame budget
+    (gy, budget) = (area.bottom-1, 1.0/config.FRAMES_PER_SECOND)
+    for (i, row) in enumerate(list(history)[-area.w:]):
+        h = min(graph_height, int(graph_height*sum(row)/budget))
+        env.vbuffer.fill(0x00ff00 if h < graph_height else 0xff0000, (x+i, gy-h, 1, h))
+    return area
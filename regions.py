@@ -0,0 +1,53 @@
+
+import array
+from util import Rect
+
+# Walkable regions: the passable tiles of a map merged greedily into
+# maximal rectangles, which let tile collision skip actors standing
+# wholly inside one.  Compiling is memoized on the passability grid, so
+# rooms that are revisited, or share a layout, pay for it once.
+
+NONE = 0xffff
+_compiled = {}
+
+class Regions:
+    def __init__(self, w, h, passable, tile_dim_pot):
+        (self.w, self.h) = (w, h)
+        self.owner = array.array('H', [NONE]) * (w*h)
+        (self.tiles, self.rects) = ([], [])
+        for start in xrange(w*h):
+            if not passable[start] or self.owner[start] != NONE: continue
+            (x0, y0) = (start % w, start // w)
+            x1 = x0+1
+            while x1 < w and passable[x1+y0*w] and self.owner[x1+y0*w] == NONE: x1 += 1
+            y1 = y0+1
+            while y1 < h and all(passable[x+y1*w] and self.owner[x+y1*w] == NONE
+                                 for x in xrange(x0, x1)):
+                y1 += 1
+            n = len(self.tiles)
+            for y in xrange(y0, y1):
+                self.owner[x0+y*w:x1+y*w] = array.array('H', [n]) * (x1-x0)
+            self.tiles.append(Rect(x0, y0, x1-x0, y1-y0))
+            self.rects.append(Rect(x0<<tile_dim_pot, y0<<tile_dim_pot,
+                                   (x1-x0)<<tile_dim_pot, (y1-y0)<<tile_dim_pot))
+
+    def __len__(self): return len(self.tiles)
+
+    def at(self, tile):
+        "The index of the region containing TILE, or None."
+        (x,y) = tile
+        if not (0 <= x < self.w and 0 <= y < self.h): return None
+        n = self.owner[x + y*self.w]
+        return None if n == NONE else n
+
+    def enclosing(self, rect, tile_dim_pot):
+        "The index of a region wholly containing the pixel rectangle RECT, or None."
+        n = self.at((rect.left>>tile_dim_pot, rect.top>>tile_dim_pot))
+        if n is not None and self.rects[n].contains(rect): return n
+        return None
+
+def compile(tilemap):
+    key = (tilemap.w, tilemap.tile_dim_pot, str(tilemap.passable))
+    if key not in _compiled:
+        _compiled[key] = Regions(tilemap.w, tilemap.h, tilemap.passable, tilemap.tile_dim_pot)
+    return _compiled[key]
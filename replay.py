@@ -0,0 +1,61 @@
+"""
+Input replays.  A replay holds the controls a GameState saw on each of
+its updates, along with the seed the random module had when the state
+was made; seeding the same way and feeding the frames back through
+env's pressed and tapped reproduces the session exactly, without SDL
+events.  All integers are little-endian.
+
+    header      'BZRP', u16 version, u32 seed, u16 level
+    frame       u8 pressed, u8 tapped, f64 delta_t
+
+Pressed and tapped are bitmasks over env.buttons, in order.
+"""
+import struct
+import env
+
+MAGIC = 'BZRP'
+VERSION = 1
+_header = struct.Struct('<4sHIH')
+_frame = struct.Struct('<BBd')
+
+def _mask(states):
+    return sum(1<<i for (i,b) in enumerate(env.buttons) if states[b])
+
+def _unmask(mask, states):
+    for (i,b) in enumerate(env.buttons): states[b] = bool(mask & (1<<i))
+
+class Recorder:
+    def __init__(self, path, seed, level_number=1):
+        self.file = open(path, 'wb')
+        self.file.write(_header.pack(MAGIC, VERSION, seed, level_number))
+
+    def capture(self, delta_t):
+        "Records the controls as they stand for an update of DELTA_T."
+        self.file.write(_frame.pack(_mask(env.pressed), _mask(env.tapped), delta_t))
+
+    def close(self): self.file.close()
+
+class Player:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        (magic, version, self.seed, self.level_number) = _header.unpack_from(data, 0)
+        if magic != MAGIC: raise ValueError('%s: not a replay' % path)
+        if version != VERSION: raise ValueError('%s: unsupported replay version %d' % (path, version))
+        self.frames = [_frame.unpack_from(data, at)
+                       for at in xrange(_header.size, len(data)-_frame.size+1, _frame.size)]
+        self.at = 0
+
+    def __len__(self): return len(self.frames)
+
+    def feed(self):
+        "Sets env's controls from the next frame and returns its delta_t, or None at the end."
+        if self.at == len(self.frames): return None
+        (pressed, tapped, delta_t) = self.frames[self.at]
+        self.at += 1
+        _unmask(pressed, env.pressed)
+        _unmask(tapped, env.tapped)
+        return delta_t
+
+    # as a bench policy, one frame per simulation step
+    def __call__(self, delta_t): self.feed()
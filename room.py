@@ -1,56 +1,157 @@
-import operator
+import logging
 
-import env, tilemap, actor, slabcache
+import env, config, tilemap, actor, slabcache, broadphase, dirt, physics, profiler, navigation, regions, senses, visibility
 from util import *
 
+def prepare(room):
+    """
+    Builds the parts of a Room that do not depend on its actors: the
+    tilemap, with passability compiled, the walkable regions and line
+    of sight between tiles.  Safe to call off the main thread.
+    """
+    # NOTE: no alpha since no layers, presently
+    # the map is copied since set_tile may change it, and levels
+    # hand out the same room for every visit
+    t = tilemap.SimpleTilemap(slabcache.load(room['slab']), room['map'][:], room['dim'],
+                              prerender=config.PRERENDER_TILEMAPS)
+    t.compile_passability(room['tile properties'])
+    return (t, regions.compile(t), visibility.compile(t))
+
 class Room:
-    def __init__(self, parent=None, room=None, **kwds):
-        (self.dirt, self.actors, self.condemned) = ([],[],set())
+    # PREPARED, if given, is the result of prepare(ROOM), used only once
+    def __init__(self, parent=None, room=None, prepared=None, **kwds):
+        (self.dirt, self.actors, self.condemned) = (dirt.DirtyRegions(),[],set())
         (self.parent, self.room) = (parent,room)
-        # NOTE: no alpha since no layers, presently
-        self.tilemap = tilemap.SimpleTilemap(slabcache.load(room['slab']), room['map'], room['dim'])
+        (self.tilemap, self.regions, self.visibility) = prepared or prepare(room)
+        self.broadphase = broadphase.SpatialHash(self.tilemap.tile_dim_pot)
+        # paths are for robots, so only go where a robot fits
+        self.navigation = navigation.FlowField(self.tilemap, Rect(actor.archetypes['robot']['collision rectangle']).size)
+        self.humanoid = None
+        # tiles the humanoid can see from where it is, updated each step
+        self.humanoid_seen = 0
+        self.batch = None
+        if config.BATCH_PHYSICS:
+            if physics.available: self.batch = physics.Batch()
+            else: logging.warning('room: NumPy is unavailable; falling back to per-actor physics.')
+        self.senses = None
+        if config.SENSES:
+            if senses.available: self.senses = senses.Senses(self.tilemap)
+            else: logging.warning('room: NumPy is unavailable; robots will neither smell nor hear.')
         self.smirch(env.vbuffer.get_rect())
         for (archetype,position) in room['actors']: self.spawn(archetype, position)
 
+    # Archetypes with a pool recycle reaped instances rather than
+    # allocating new ones.
     def spawn(self, archetype, position, **kwds):
-        self.actors.append(actor.archetypes[archetype]['class'](archetype=actor.archetypes[archetype],
-                                                                spawn_pt=position,
-                                                                parent=self,
-                                                                **kwds))
+        a = actor.archetypes[archetype]
+        if a.get('pool'):
+            instance = a['pool'].pop()
+            instance.__init__(archetype=a, spawn_pt=position, parent=self, **kwds)
+        else:
+            instance = a['class'](archetype=a, spawn_pt=position, parent=self, **kwds)
+        instance.index = len(self.actors)
+        self.actors.append(instance)
+        self.relocate(instance)
+        if archetype == 'humanoid': self.humanoid = instance
+        if self.senses is not None and 'noise' in a: self.senses.noise.emit(self.tile_of(instance), a['noise'])
+
+    def relocate(self, actor):
+        self.broadphase.file(actor, actor.collision_rect.move(actor.rect.topleft))
+
+    def centre_of(self, actor):
+        "The center of ACTOR's collision rectangle."
+        return actor.collision_rect.move(actor.rect.topleft).center
+
+    def tile_of(self, actor):
+        "The map cell under the center of ACTOR's collision rectangle."
+        (x,y) = self.centre_of(actor)
+        return (x>>self.tilemap.tile_dim_pot, y>>self.tilemap.tile_dim_pot)
+
+    def sees_humanoid(self, actor):
+        "Whether ACTOR and the humanoid are in sight of each other."
+        (x,y) = self.tile_of(actor)
+        if not (0 <= x < self.tilemap.w and 0 <= y < self.tilemap.h): return False
+        return bool(self.humanoid_seen >> (x + y*self.tilemap.w) & 1)
+
+    def set_tile(self, position, tile):
+        (x,y) = position
+        was = self.tilemap.passable[x + y*self.tilemap.w]
+        self.smirch(self.tilemap.set_tile(position, tile))
+        if self.tilemap.passable[x + y*self.tilemap.w] != was:
+            self.regions = regions.compile(self.tilemap)
+            # built as tiles are asked about, rather than all at once here
+            self.visibility = visibility.Visibility(self.tilemap)
 
     def reap(self, actor):
         self.condemned.add(actor)
 
-    # We could merge common subrectangles here, but it's probably not
-    # necessary.  If profiling shows it's costly, we can change the
-    # data structure.  At least checking to see if the same rectangle
-    # is already there might help in some cases.
+    # Duplicates and contained rectangles are dropped here; overlapping
+    # ones are merged when the room sweeps.
     def smirch(self, rect):
-        self.dirt.append(rect)
+        self.dirt.add(rect)
 
-    # redraw that flags an area as dirty: when an actor is placed or
-    # moved, its _old_ position is flagged as dirty; redraw then draws
-    # only the background areas marked dirty, and then draws the sprites.
-    # animation marks an area dirty, so does moving.
+    # redraw that flags an area as dirty: where each actor was _last
+    # drawn_ is flagged as dirty; redraw then draws only the background
+    # areas marked dirty, and then draws the sprites.
     def sweep(self):
-        for d in self.dirt: self.tilemap.draw((0,0), d)
-        self.dirt = []
+        for d in self.dirt.flush():
+            env.smirch(self.tilemap.draw((0,0), d))
+
+    def draw(self, alpha):
+        p = profiler.enabled
+        if p: t = profiler.now()
+        for actor in self.actors:
+            if actor.drawn: self.smirch(actor.drawn)
+        self.sweep()
+        if p: t = profiler.lap('sweep', t)
+        for actor in self.actors:
+            actor.drawn = actor.draw(alpha)
+            if actor.drawn: env.smirch(actor.drawn)
+        if p: profiler.lap('draw', t)
 
     def update(self, delta_t):
+        p = profiler.enabled
+        if p: t = profiler.now()
+        # what robots know of the humanoid: path, sight, scent and noise
+        if self.humanoid is not None:
+            self.navigation.seek(self.navigation.cell_of(self.centre_of(self.humanoid)))
+            self.humanoid_seen = self.visibility.visible_from(self.tile_of(self.humanoid))
+        else:
+            self.humanoid_seen = 0
+        self.navigation.update()
+        if self.senses is not None:
+            if self.humanoid is not None:
+                self.senses.scent.emit(self.tile_of(self.humanoid), self.humanoid.archetype['scent']*delta_t)
+            self.senses.update(delta_t)
+        if p: t = profiler.lap('ai', t)
         # physics and collision
+        if self.batch is not None: self.batch.integrate(config.DAMPING)
         for actor in self.actors:
             actor.update_motion(delta_t)
+            if p: t = profiler.lap('motion', t)
             actor.act(delta_t)
+            if p: t = profiler.lap('act', t)
             # world collision, if applicable
             self.check_border_collision(actor)
+            if p: t = profiler.lap('border', t)
             self.check_tile_collision(actor)
+            self.relocate(actor)
+            if p: t = profiler.lap('tiles', t)
         # collision with groups, if applicable
         self.check_actor_collisions()
-        self.sweep()
-        for actor in self.actors: actor.draw()
-        for marked in self.condemned:
-            self.smirch(marked.rect)
-            self.actors.remove(marked)
+        if p: profiler.lap('actors', t)
+        # the last actor takes each removed one's place; going from the
+        # highest index down keeps the resulting order deterministic
+        for marked in sorted(self.condemned, key=lambda a: a.index, reverse=True):
+            if marked.drawn: self.smirch(marked.drawn)
+            if marked is self.humanoid: self.humanoid = None
+            last = self.actors.pop()
+            if last is not marked: (self.actors[marked.index], last.index) = (last, marked.index)
+            self.broadphase.remove(marked)
+            if marked.slot is not None: self.batch.remove(marked.slot)
+            if 'pool' in marked.archetype:
+                marked.release()
+                marked.archetype['pool'].append(marked)
         self.condemned.clear()
 
     def check_border_collision(self, actor):
@@ -67,50 +168,53 @@ class Room:
             (actor.velocity[1], actor.y) = (0, self.tilemap.h*self.tilemap.tile_dim-actor.rect.h/2)
             actor.border_collide(Facing.SOUTH)
 
+    # Reads only the passability grid compiled with the tilemap; the
+    # loop bounds and break conditions mirror a per-tile colliderect
+    # scan so push-out results are unchanged.
     def check_tile_collision(self, actor):
         region = actor.collision_rect.move(actor.rect.left, actor.rect.top)
-        tile = Rect(0,0,self.tilemap.tile_dim,self.tilemap.tile_dim)
-        tshift = self.tilemap.tile_dim_pot
-        tmask = ~((1<<self.tilemap.tile_dim_pot)-1)
-        # only draw tiles in region offset by camera
-        for y in xrange(region.top&tmask, self.tilemap.tile_dim+(region.bottom&tmask), self.tilemap.tile_dim):
-            if (y>>tshift) not in range(self.tilemap.h): break
-            for x in xrange(region.left&tmask, self.tilemap.tile_dim+(region.right&tmask), self.tilemap.tile_dim):
-                if (x>>tshift) not in range(self.tilemap.w): break
-                tile.topleft = (x,y)
-                if not region.colliderect(tile): break
-                props = self.room['tile properties'].get(self.tilemap.map[(x>>tshift)+(y>>tshift)*self.tilemap.w])
+        # wholly inside one walkable rectangle, nothing to collide with
+        if self.regions.enclosing(region, self.tilemap.tile_dim_pot) is not None: return
+        (right, bottom, (cx,cy)) = (region.right, region.bottom, region.center)
+        (w, h, passable) = (self.tilemap.w, self.tilemap.h, self.tilemap.passable)
+        (td, tshift) = (self.tilemap.tile_dim, self.tilemap.tile_dim_pot)
+        (tmask, half) = (~(td-1), td>>1)
+        for y in xrange(region.top&tmask, td+(bottom&tmask), td):
+            row = y>>tshift
+            if not 0 <= row < h: break
+            for x in xrange(region.left&tmask, td+(right&tmask), td):
+                col = x>>tshift
+                if not 0 <= col < w: break
+                if x >= right or y >= bottom: break
+                if passable[col+row*w]: continue
                 # compute vector from center of actor to center of tile
-                delta = map(operator.sub, tile.center, region.center)
-                # only flag collision if velocity differs (note this
-                # check should not apply to special properties, only
-                # passable)
-                if props is None or not (props & tilemap.PASSABLE):
-                    (vx,vy) = actor.velocity
-                    if abs(delta[0]) > abs(delta[1]): # horizontal
-                        if delta[0] > 0:
-                            actor.rect.right = x
-                        else:
-                            actor.rect.left = x+self.tilemap.tile_dim
-                        actor.position = actor.rect.center
-                        vx = 0
-                    if abs(delta[1]) > abs(delta[0]): # vertical
-                        if delta[1] > 0:
-                            actor.rect.bottom = y
-                        else:
-                            actor.rect.top = y+self.tilemap.tile_dim-actor.collision_rect.top
-                        actor.position = actor.rect.center
-                        vy = 0
-                    actor.velocity = (vx,vy)
-                    actor.tile_collide((x,y), props)
+                (dx,dy) = (x+half-cx, y+half-cy)
+                (vx,vy) = actor.velocity
+                if abs(dx) > abs(dy): # horizontal
+                    if dx > 0:
+                        actor.rect.right = x
+                    else:
+                        actor.rect.left = x+td
+                    actor.position = actor.rect.center
+                    vx = 0
+                if abs(dy) > abs(dx): # vertical
+                    if dy > 0:
+                        actor.rect.bottom = y
+                    else:
+                        actor.rect.top = y+td-actor.collision_rect.top
+                    actor.position = actor.rect.center
+                    vy = 0
+                actor.velocity = (vx,vy)
+                actor.tile_collide((x,y), self.room['tile properties'].get(self.tilemap.map[col+row*w]))
 
+    # Only pairs sharing a broad phase cell are tested; candidates come
+    # back in spawn order, so responses resolve as they would with a
+    # full pairwise scan.
     def check_actor_collisions(self):
         for actor in self.actors:
-            for other in self.actors:
-                if other is actor: continue
-                (a,b) = (actor.collision_rect.move(actor.rect.topleft),
-                         other.collision_rect.move(other.rect.topleft))
-                if a.colliderect(b):
+            a = actor.collision_rect.move(actor.rect.topleft)
+            for other in self.broadphase.candidates(actor):
+                if a.colliderect(other.collision_rect.move(other.rect.topleft)):
                     if actor.collide(other):
                         actor.velocity = map(lambda x,y:x if signum(x)*signum(y) == 1 else 0, actor.velocity, other.velocity)
 
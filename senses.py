@@ -0,0 +1,77 @@
+
+import config
+from util import Facing
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+available = numpy is not None
+NOWHERE = 0xff
+
+class Field:
+    """
+    A quantity spread over a room's tiles, such as scent or noise.
+    Sources add to it at a tile; step() lets it diffuse into the
+    passable neighbouring tiles and decay, then works out for every
+    tile which neighbour holds more of it, so that lookups are O(1)
+    however many actors make them.
+    """
+    def __init__(self, tilemap, diffusion, decay):
+        (self.w, self.h, self.passable) = (tilemap.w, tilemap.h, tilemap.passable)
+        (self.diffusion, self.decay) = (diffusion, decay)
+        self.grid = numpy.zeros((self.h, self.w))
+        self.toward = numpy.empty((self.h, self.w), numpy.uint8)
+        self.toward.fill(NOWHERE)
+
+    def emit(self, tile, amount):
+        (x,y) = tile
+        if 0 <= x < self.w and 0 <= y < self.h: self.grid[y,x] += amount
+
+    def _neighbours(self):
+        "At each tile, the field in the next tile toward every Facing; zero off the map."
+        (g, (h, w)) = (self.grid, self.grid.shape)
+        out = numpy.zeros((len(Facing.offsets), h, w))
+        for (f,(dx,dy)) in enumerate(Facing.offsets):
+            out[f, max(0,-dy):h-max(0,dy), max(0,-dx):w-max(0,dx)] = \
+                g[max(0,dy):h-max(0,-dy), max(0,dx):w-max(0,-dx)]
+        return out
+
+    def step(self):
+        g = self.grid
+        passable = numpy.frombuffer(self.passable, numpy.uint8).reshape(self.h, self.w)
+        g += self.diffusion * (self._neighbours().mean(axis=0) - g)
+        g *= self.decay * passable
+        neighbours = self._neighbours()
+        self.toward[:] = numpy.where(neighbours.max(axis=0) > g, neighbours.argmax(axis=0), NOWHERE)
+
+    def strength(self, tile):
+        (x,y) = tile
+        return self.grid[y,x] if 0 <= x < self.w and 0 <= y < self.h else 0.0
+
+    def direction(self, tile, threshold=0.0):
+        "The Facing from TILE toward more of the field, or None where it is fainter than THRESHOLD."
+        (x,y) = tile
+        if not (0 <= x < self.w and 0 <= y < self.h) or self.grid[y,x] < threshold: return None
+        f = self.toward[y,x]
+        return None if f == NOWHERE else int(f)
+
+class Senses:
+    "The scent and noise fields of a room, stepped every config.SENSES_PERIOD seconds."
+    def __init__(self, tilemap):
+        self.scent = Field(tilemap, *config.SCENT)
+        self.noise = Field(tilemap, *config.NOISE)
+        self.accumulated_t = 0.0
+
+    def update(self, delta_t):
+        self.accumulated_t += delta_t
+        while self.accumulated_t >= config.SENSES_PERIOD:
+            self.accumulated_t -= config.SENSES_PERIOD
+            self.scent.step()
+            self.noise.step()
+
+    def direction(self, tile):
+        "Where a hunter at TILE would head: toward noise if it hears any, else toward scent."
+        f = self.noise.direction(tile, config.SENSES_THRESHOLD)
+        return f if f is not None else self.scent.direction(tile, config.SENSES_THRESHOLD)
@@ -1,26 +1,112 @@
 
 import pygame
-import logging
-import env
+import logging, weakref, threading, collections, Queue
+import env, config, bundle
 
-# Under more serious memory contention, or with a lot of resources, we
-# could start an implicit eviction policy and convert potentially
-# evicted entries to weakrefs, resurrecting if they get a hit before
-# being collected.  For now, it seems unnecessary for such a small
-# game.
+# Entries are held strongly while they fit in config.SLABCACHE_BUDGET
+# bytes, least recently used first.  Past the budget the oldest are
+# demoted to weakrefs, and resurrected if they get a hit before being
+# collected.
+#
+# prefetch() decodes files on a worker thread, ahead of the load()
+# that needs them; conversion to the display format still happens in
+# load(), on the main thread.
+#
+# Files in a mounted bundle are never decoded; their surfaces are
+# built straight from the bundle's pixels.
 
-_cache = {}
+_cache = collections.OrderedDict()
+_weak = weakref.WeakValueDictionary()
+_bytes = 0
+# load() and wipe() may be called from other threads too (see streamer)
+_lock = threading.RLock()
+
+_bundle = None
+
+_requests = Queue.Queue()
+_pending = {}
+_worker = None
+
+def _size(image): return image.get_pitch() * image.get_height()
+
+def _admit(file, image):
+    global _bytes
+    _cache[file] = image
+    _bytes += _size(image)
+    while _bytes > config.SLABCACHE_BUDGET and len(_cache) > 1:
+        (old, evicted) = _cache.popitem(last=False)
+        _bytes -= _size(evicted)
+        _weak[old] = evicted
+        logging.debug('slabcache: Demoted "%s" slab to a weak reference.' % old)
+
+def mount(path):
+    "Serves slabs from the bundle at PATH from now on, where it has them."
+    global _bundle
+    _bundle = bundle.Bundle(path)
+
+def _decode(file):
+    if _bundle is not None and file in _bundle:
+        return _bundle.surface(file)
+    if file in _pending:
+        (done, result) = _pending.pop(file)
+        done.wait()
+        if isinstance(result[0], Exception): raise result[0]
+        return result[0]
+    return pygame.image.load(file)
 
 def load(file, alpha_p=False):
-    if _cache.has_key(file):
+    with _lock:
+        return _load(file, alpha_p)
+
+def _load(file, alpha_p):
+    if file in _cache:
         logging.debug('slabcache: Fetched cached "%s" slab.' % file)
-        return _cache[file]
-    logging.debug('slabcache: Loaded "%s" slab into cache.' % file)
-    image = pygame.image.load(file)
-    (image.convert_alpha if alpha_p else image.convert)(env.vbuffer)
-    _cache[file] = image
+        image = _cache.pop(file)
+        _cache[file] = image
+        return image
+    image = _weak.get(file)
+    if image is not None:
+        logging.debug('slabcache: Resurrected "%s" slab.' % file)
+        del _weak[file]
+    else:
+        logging.debug('slabcache: Loaded "%s" slab into cache.' % file)
+        image = _decode(file)
+        # keep per-pixel alpha when the file has it
+        alpha_p = alpha_p or image.get_flags() & pygame.SRCALPHA
+        image = (image.convert_alpha if alpha_p else image.convert)(env.vbuffer)
+    _admit(file, image)
     return image
 
+def _work():
+    while True:
+        (file, done, result) = _requests.get()
+        try:
+            result.append(pygame.image.load(file))
+        except Exception, e:
+            result.append(e)
+        done.set()
+
+def prefetch(files):
+    with _lock:
+        _prefetch(files)
+
+def _prefetch(files):
+    global _worker
+    for file in files:
+        if file in _cache or file in _pending or _weak.get(file) is not None: continue
+        if _bundle is not None and file in _bundle: continue
+        logging.debug('slabcache: Prefetching "%s" slab.' % file)
+        request = (file, threading.Event(), [])
+        _pending[file] = request[1:]
+        _requests.put(request)
+    if _worker is None and _pending:
+        _worker = threading.Thread(target=_work, name='slabcache')
+        _worker.daemon = True
+        _worker.start()
+
 def wipe(file):
     logging.debug('slabcache: Explicitly wiped "%s" slab.' % file)
-    del _cache[file]
+    global _bytes
+    with _lock:
+        if file in _cache: _bytes -= _size(_cache.pop(file))
+        _weak.pop(file, None)
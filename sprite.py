@@ -2,30 +2,44 @@ import math
 import env
 from util import Rect
 
-class Sprite:
-    def __init__(self, slab=None, animations=None, position=(0,0), **kwds):
-        if animations is None: animations = {'default':[(0,Rect(0,0,slab.w,slab.h))]}
-        (self.slab,self.animations) = (slab,animations)
+def compile_frames(slab, animations):
+    """
+    Slices SLAB into a frame table: animation name to a tuple of
+    (duration, image, size) frames, where each image is a subsurface of
+    SLAB.  Tables are never modified, so sprites can share them.
+    """
+    return dict((name, tuple((duration, slab.subsurface(area), area.size) for (duration, area) in frames))
+                for (name, frames) in animations.iteritems())
+
+class Sprite(object):
+    __slots__ = ('frames', 'animation_name', '__a', 'frame', 'rect_valid', '__accumulated_t',
+                 'has_looped', 'rect', 'image', 'hidden')
+
+    def __init__(self, slab=None, animations=None, position=(0,0), frames=None, **kwds):
+        if frames is None:
+            if animations is None: animations = {'default':[(0,slab.get_rect())]}
+            frames = compile_frames(slab, animations)
+        self.frames = frames
         self.animation_name = None
-        self.animation(self.animations.keys()[0])
+        self.animation(self.frames.keys()[0])
         self.rect = Rect(position, (0,0))
         self._update_rect()
         self.hidden = False
 
-    def draw(self):
+    def draw(self, at=None):
         if not self.hidden:
-            env.vbuffer.blit(self.slab, self.rect, self.__a[self.frame][1])
+            return env.vbuffer.blit(self.image, self.rect if at is None else at)
 
     def animation(self, name):
         if self.animation_name == name: return
         self.animation_name = name
-        self.__a = self.animations[name]
+        self.__a = self.frames[name]
         (self.frame,self.rect_valid,self.__accumulated_t,self.has_looped) = (0,False,0,False)
 
     def invalidate_rect(self): pass
 
     def _update_rect(self):
-        self.rect.size = self.__a[self.frame][1].size
+        (_, self.image, self.rect.size) = self.__a[self.frame]
         self.rect_valid = True
 
     def update(self, delta_t):
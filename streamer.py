@@ -0,0 +1,44 @@
+"""
+Prepares rooms before they are entered.  prepare() queues a room of a
+level for a worker thread, which decodes it and builds its tilemap,
+slab, collision and sight data with room.prepare(); take() hands the
+result over when the room is entered, waiting only if the worker has
+not finished it yet.  Each prepared room is handed over once.
+"""
+import logging, threading, Queue
+import level, room
+
+_requests = Queue.Queue()
+_pending = {}
+_worker = None
+
+def _work():
+    while True:
+        ((path, index), done, result) = _requests.get()
+        try:
+            result.append(room.prepare(level.load(path).room(index)))
+        except Exception, e:
+            result.append(e)
+        done.set()
+
+def prepare(path, index):
+    "Queues room INDEX of the level at PATH, unless it is already waiting."
+    global _worker
+    key = (path, index)
+    if key in _pending: return
+    logging.debug('streamer: Preparing room %d of "%s".' % (index, path))
+    request = (key, threading.Event(), [])
+    _pending[key] = request[1:]
+    _requests.put(request)
+    if _worker is None:
+        _worker = threading.Thread(target=_work, name='streamer')
+        _worker.daemon = True
+        _worker.start()
+
+def take(path, index):
+    "The prepared room INDEX of the level at PATH, or None if it was never queued."
+    if (path, index) not in _pending: return None
+    (done, result) = _pending.pop((path, index))
+    done.wait()
+    if isinstance(result[0], Exception): raise result[0]
+    return result[0]
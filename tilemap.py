@@ -1,4 +1,6 @@
+import pygame
 import env
+from util import Rect
 
 # Constants
 PASSABLE = 1
@@ -7,19 +9,57 @@ class SimpleTilemap:
     """
     Note: specialized for square, power-of-two-sized tiles.  Needs to
     be revamped for other purposes.
+
+    With prerender, the whole map is drawn once into a background
+    surface and repairs become a single blit per region.
     """
-    def __init__(self, slab, map, dim, tile_dim_pot = 4):
+    def __init__(self, slab, map, dim, tile_dim_pot = 4, prerender = False):
         (self.w,self.h) = dim
         (self.slab,self.map,self.tile_dim) = (slab,map,1<<tile_dim_pot)
         self.tile_dim_pot = tile_dim_pot
+        (self.properties, self.background) = (None, None)
+        if prerender: self.prerender()
 
-    def draw(self, camera, region):
+    def prerender(self):
+        self.background = pygame.Surface((self.w<<self.tile_dim_pot, self.h<<self.tile_dim_pot), 0, env.vbuffer)
+        self._draw_tiles(self.background, self.background.get_rect())
+
+    def _tile_bounds(self, region):
+        "The whole tiles touched by REGION, which may exceed it, clipped to the map."
         tshift = self.tile_dim_pot
         tmask = ~((1<<self.tile_dim_pot)-1)
+        (x0,x1) = (max(0,region.x&tmask), min(self.w<<tshift,self.tile_dim+(region.right&tmask)))
+        (y0,y1) = (max(0,region.y&tmask), min(self.h<<tshift,self.tile_dim+(region.bottom&tmask)))
+        return Rect(x0, y0, max(0,x1-x0), max(0,y1-y0))
+
+    def _draw_tiles(self, target, bounds):
+        tshift = self.tile_dim_pot
+        for y in xrange(bounds.top, bounds.bottom, self.tile_dim):
+            for x in xrange(bounds.left, bounds.right, self.tile_dim):
+                target.blit(self.slab, (x,y),
+                            (self.map[(x>>tshift) + ((y>>tshift) * self.w)] * self.tile_dim,
+                             0, self.tile_dim, self.tile_dim))
+
+    def draw(self, camera, region):
         # only draw tiles in region offset by camera
-        for y in xrange(max(0,region.y&tmask), min(self.h<<tshift,self.tile_dim+(region.bottom&tmask)), self.tile_dim):
-            for x in xrange(max(0,region.x&tmask), min(self.w<<tshift,self.tile_dim+(region.right&tmask)), self.tile_dim):
-                env.vbuffer.blit(self.slab, (x,y),
-                                 (self.map[(x>>tshift) + ((y>>tshift) * self.w)] * self.tile_dim,
-                                  0, self.tile_dim, self.tile_dim))
+        bounds = self._tile_bounds(region)
+        if self.background is None:
+            self._draw_tiles(env.vbuffer, bounds)
+        elif bounds.w and bounds.h:
+            env.vbuffer.blit(self.background, bounds, bounds)
+        return bounds
+
+    def set_tile(self, position, tile):
+        "Change the tile at map cell POSITION; returns the area to repaint."
+        (x,y) = position
+        self.map[x + y*self.w] = tile
+        if self.properties is not None:
+            self.passable[x + y*self.w] = 1 if self.properties.get(tile,0) & PASSABLE else 0
+        rect = Rect(x<<self.tile_dim_pot, y<<self.tile_dim_pot, self.tile_dim, self.tile_dim)
+        if self.background is not None: self._draw_tiles(self.background, rect)
+        return rect
 
+    def compile_passability(self, properties):
+        "Flatten tile PROPERTIES into one byte per map cell, nonzero where passable."
+        self.properties = properties
+        self.passable = bytearray(1 if properties.get(t,0) & PASSABLE else 0 for t in self.map)
@@ -1,12 +1,30 @@
 from util import *
+import collections
 import easing
 import env
 
+class Snapshot(State):
+    """
+    Stands in for an outgoing state with a copy of the last frame it
+    drew, taken once; nothing is simulated or redrawn after that.
+    """
+    def __init__(self, **kwds):
+        State.__init__(self, **kwds)
+        self.image = env.vbuffer.copy()
+        self.exposed = [self.image.get_rect()]
+
+    def draw(self, alpha):
+        for r in self.exposed: env.vbuffer.blit(self.image, r, r)
+        env.smirch(*self.exposed)
+        self.exposed = []
+
+    def expose(self, rect): self.exposed.append(Rect(rect))
+
 class Sequence(State):
     """A state for sequencing transitions atop another state."""
     def __init__(self, sequence, atop=None, after=None, **kwds):
         State.__init__(self, **kwds)
-        (self.sequence, self.atop, self.after) = (sequence, atop, after)
+        (self.sequence, self.atop, self.after) = (collections.deque(sequence), atop, after)
 
     def update(self, delta_t):
         if not self.sequence: return self.after
@@ -15,9 +33,16 @@ class Sequence(State):
 
         _ = self.sequence[0].update(delta_t)
         if _ is not self.sequence[0]:
-            self.sequence.pop(0)
+            self.sequence.popleft()
         return self
 
+    def draw(self, alpha):
+        if self.atop is not None: self.atop.draw(alpha)
+        if self.sequence: self.sequence[0].draw(alpha)
+
+    def expose(self, rect):
+        if self.atop is not None: self.atop.expose(rect)
+
 class Generic(State):
     def __init__(self, atop=None, after=None, duration=1.0, easing=easing.cubic, **kwds):
         State.__init__(self, **kwds)
@@ -30,6 +55,12 @@ class Generic(State):
         self.around_update(delta_t)
         return self if self.accumulated_t < self.duration else self.after
 
+    def draw(self, alpha):
+        if self.atop is not None: self.atop.draw(alpha)
+
+    def expose(self, rect):
+        if self.atop is not None: self.atop.expose(rect)
+
 class Hold(Generic):
     def __init__(self, **kwds):
         Generic.__init__(self, **kwds)
@@ -49,24 +80,71 @@ class Fade(Generic):
     def around_update(self, delta_t):
         env.fade(self.start + (self.end-self.start)*self.easing(self.accumulated_t, self.duration))
 
-class SlideIn(Generic):
-    def __init__(self, start=1.0, end=0.0, **kwds):
+def _strip(outer, inner):
+    "OUTER less INNER, where INNER is OUTER cut back from one side."
+    if inner.w <= 0 or inner.h <= 0: return outer
+    if inner.left > outer.left: return Rect(outer.left, outer.top, inner.left-outer.left, outer.h)
+    if inner.right < outer.right: return Rect(inner.right, outer.top, outer.right-inner.right, outer.h)
+    if inner.top > outer.top: return Rect(outer.left, outer.top, outer.w, inner.top-outer.top)
+    if inner.bottom < outer.bottom: return Rect(outer.left, inner.bottom, outer.w, outer.bottom-inner.bottom)
+    return None
+
+class Wipe(Generic):
+    """
+    Uncovers the state underneath, ATOP, as the edge of the outgoing
+    frame, copied when the wipe starts, travels toward FACING.  Atop
+    is told about each newly uncovered strip, and the outgoing frame is
+    put back only where atop drew under what remains of it.  Should
+    atop move on to another state meanwhile, the wipe ends there and
+    hands that state over.
+    """
+    moving = False
+
+    def __init__(self, facing=Facing.EAST, **kwds):
         Generic.__init__(self, **kwds)
-        (self.start, self.end) = (start, end)
+        (self.image, self.facing) = (env.vbuffer.copy(), facing)
+        (self.covered, self.offset) = (self.image.get_rect(), (0,0))
 
     def around_update(self, delta_t):
-        # blit old screen at w*easing(self.accumulated_t,self.duration),0
-        # blit new screen at w+w*easing(self.accumulated_t,self.duration),0
-        #env.overlay_offset = (env.vbuffer.w*self.easing(self.accumulated_t, self.duration),0)
-        #env.vbuffer_offset = (env.vbuffer.w+env.vbuffer.w*self.easing(self.accumulated_t, self.duration),0)
-        pass
+        (w,h) = self.image.get_size()
+        t = min(1.0, self.easing(self.accumulated_t, self.duration))
+        (dx,dy) = Facing.offsets[self.facing]
+        self.offset = (int(w*t)*dx, int(h*t)*dy)
+
+    def update(self, delta_t):
+        atop = self.atop
+        state = Generic.update(self, delta_t)
+        if self.atop is not atop: state = self.atop
+        if state is not self and self.atop is not None: self.atop.expose(self.covered)
+        return state
+
+    def draw(self, alpha):
+        covered = self.image.get_rect().move(self.offset).clip(self.image.get_rect())
+        strip = _strip(self.covered, covered)
+        if strip is not None:
+            if self.atop is not None: self.atop.expose(strip)
+            else: env.vbuffer.fill(0, strip)
+        self.covered = covered
+        Generic.draw(self, alpha)
+        if covered.w <= 0 or covered.h <= 0: return
+        (ox,oy) = self.offset if self.moving else (0,0)
+        dirt = env.smirched()
+        if dirt is None or self.moving: areas = [covered]
+        else: areas = [r.clip(covered) for r in dirt]
+        for r in areas: env.vbuffer.blit(self.image, r, r.move(-ox,-oy))
+        if dirt is not None and self.moving: env.smirch(covered)
+
+class SlideIn(Wipe):
+    "A Wipe where the outgoing frame slides away with its edge."
+    moving = True
 
-def FadeInOut(hold_duration = 0, **kwds):
+def FadeInOut(hold_duration = 0, atop=None, after=None, **kwds):
     return Sequence([Fade(start=0.0, end=1.0, **kwds),
                      Hold(duration=hold_duration, **kwds),
-                     Fade(start=1.0, end=0.0, **kwds)], **kwds)
+                     Fade(start=1.0, end=0.0, **kwds)], atop=atop, after=after, **kwds)
 
+# the outgoing state is not run during the fade; what it last drew is
 def FadeOutIn(out_from=None, in_to=None, **kwds):
-    return Fade(atop=out_from, start=1.0, end=0.0,
+    return Fade(atop=None if out_from is None else Snapshot(), start=1.0, end=0.0,
                 after=Fade(start=0.0, end=1.0, atop=in_to, after=in_to, **kwds),
                 **kwds)
@@ -3,6 +3,12 @@ import math
 class State:
     def __init__(self, **kwds): pass
     def update(self, delta_t): return self
+    # called once per displayed frame, after any simulation steps;
+    # ALPHA is how far into the next step the display is, from 0 to 1
+    def draw(self, alpha): pass
+    # something else drew over RECT of the screen; states that only
+    # redraw what changed should draw it again
+    def expose(self, rect): pass
 
 from pygame import Rect
 
@@ -13,6 +19,8 @@ class Facing:
     @staticmethod
     def to_anim_name(facing):
         return ['face north','face south','face east','face west'][facing]
+    @staticmethod
+    def opposite(facing): return facing ^ 1
 
 def sink(v, a):
     return 0 if abs(v) <= abs(a) else (v-math.copysign(a, v))
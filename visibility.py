@@ -0,0 +1,77 @@
+
+# Bitsets depend only on the passability grid, so compile() builds
+# them once per layout, like regions.compile(), and rooms that share
+# one share the result.  It is O((w*h)^2) ray walks: some 50ms for a
+# 20x13 room, over a second for 40x26.
+
+_compiled = {}
+
+class Visibility:
+    """
+    Line of sight between the tiles of a map.  The first time a tile is
+    asked about, a ray is walked from its center to the center of every
+    other tile, and the ones reached without crossing an impassable
+    tile are kept as a bitset (bit x + y*w).  After that, whether one
+    tile sees another is a single bit test.  Lines are walked the same
+    way in both directions, so sight is symmetric, and a tile already
+    done answers for itself rather than having its line walked again.
+    precompute() does every tile up front, as compile() does.
+    """
+    def __init__(self, tilemap):
+        # a copy, since compiled instances are shared between tilemaps
+        (self.w, self.h, self.passable) = (tilemap.w, tilemap.h, bytearray(tilemap.passable))
+        self.cache = {}
+
+    def _clear(self, (x0,y0), (x1,y1)):
+        (w, passable) = (self.w, self.passable)
+        # always walk from the lesser tile, so a->b and b->a agree
+        if (y1,x1) < (y0,x0): ((x0,y0), (x1,y1)) = ((x1,y1), (x0,y0))
+        (nx, ny) = (abs(x1-x0), abs(y1-y0))
+        (sx, sy) = (1 if x1 > x0 else -1, 1 if y1 > y0 else -1)
+        (x, y, ix, iy) = (x0, y0, 0, 0)
+        while ix < nx or iy < ny:
+            # which edge the line crosses next: compare (ix+1/2)/nx with (iy+1/2)/ny
+            d = (1+2*ix)*ny - (1+2*iy)*nx
+            if d == 0:
+                # through a corner; either side open will do
+                if not (passable[x+sx + y*w] or passable[x + (y+sy)*w]): return False
+                (x, y, ix, iy) = (x+sx, y+sy, ix+1, iy+1)
+            elif d < 0:
+                (x, ix) = (x+sx, ix+1)
+            else:
+                (y, iy) = (y+sy, iy+1)
+            if not passable[x + y*w]: return False
+        return True
+
+    def visible_from(self, tile):
+        "The bitset of tiles in sight of TILE."
+        if tile not in self.cache:
+            (x,y) = tile
+            (w, passable, cache) = (self.w, self.passable, self.cache)
+            if not (0 <= x < w and 0 <= y < self.h and passable[x + y*w]):
+                cache[tile] = 0
+            else:
+                (bits, me) = (0, x + y*w)
+                for i in xrange(w*self.h):
+                    if not passable[i]: continue
+                    other = (i % w, i // w)
+                    seen = cache[other] >> me & 1 if other in cache else self._clear(tile, other)
+                    if seen: bits |= 1 << i
+                cache[tile] = bits
+        return self.cache[tile]
+
+    def precompute(self):
+        for i in xrange(self.w*self.h): self.visible_from((i % self.w, i // self.w))
+
+    def can_see(self, a, b):
+        (x,y) = b
+        if not (0 <= x < self.w and 0 <= y < self.h): return False
+        return bool(self.visible_from(a) >> (x + y*self.w) & 1)
+
+def compile(tilemap):
+    key = (tilemap.w, str(tilemap.passable))
+    if key not in _compiled:
+        v = Visibility(tilemap)
+        v.precompute()
+        _compiled[key] = v
+    return _compiled[key]